@@ -1,6 +1,64 @@
 from manimlib import *
 import numpy as np
 
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)  # for tracker
+from tracker.cache import GeometryCache, source_key  # noqa: E402
+from tracker.series import kinetic_energy, kinetic_energy_approximations,\
+    kinetic_energy_coefficients, partial_sums  # noqa: E402
+
+N_APPROX = 10  # number of approximations (orders of series) shown
+APPROX_STEP = 0.01  # sampling step of approximation graphs
+
+# Sampled graphs and labels survive between renders,
+# unchanged ones are not resampled (delete the directory to reset)
+CACHE = GeometryCache(os.path.join(HERE, ".geometry_cache"))
+
+
+def axes_key(axes):  # where the axes are (graph points depend on it)
+    return tuple(np.round(np.concatenate(
+        [axes.c2p(0, 0), axes.c2p(1, 1)]), 6))
+
+
+def cached_graph(axes, key, sample, **style):
+    # graph of sample() -> (xs, ys); smoothed points are cached by key
+    def compute():
+        xs, ys = sample()
+        graph = VMobject()
+        graph.set_points_smoothly(axes.c2p(xs, ys))
+        return dict(xs=xs, ys=ys, points=graph.get_points())
+    data = CACHE.get((key, axes_key(axes), sorted(style.items())), compute)
+
+    graph = VMobject(**style)
+    graph.set_points(data["points"])
+    xs, ys = data["xs"], data["ys"]
+    graph.underlying_function = lambda x: np.interp(x, xs, ys)
+    return graph
+
+
+def cached_label(key, build, color=WHITE):
+    # Tex/Text from build(), only its compiled outlines are cached by key
+    def compute():
+        parts = build().family_members_with_points()
+        return {f"part{i}": sm.get_points() for i, sm in enumerate(parts)}
+    data = CACHE.get((key, color), compute)
+
+    label = VGroup()
+    for i in range(len(data)):
+        part = VMobject()
+        part.set_points(data[f"part{i}"])
+        label.add(part)
+    label.set_fill(color, opacity=1)
+    label.set_stroke(width=0)
+    return label
+
+
+def tex(string, color=WHITE):  # cached Tex
+    return cached_label(("Tex", string), lambda: Tex(string), color)
+
 
 class KinEnApprox(Scene):
     def construct(self):
@@ -13,94 +71,42 @@ class KinEnApprox(Scene):
             y_values=[1, 2],
             num_decimal_places=1,
         )
-        axes.add(Tex('v').shift(6.5*RIGHT+2.5*DOWN))
-        axes.add(Tex('T(v)').shift(6.5*LEFT+3.5*UP))
-        axes.add(Tex('c', color=RED).shift(2.6*DOWN+0.5*RIGHT))
+        axes.add(tex('v').shift(6.5*RIGHT+2.5*DOWN))
+        axes.add(tex('T(v)').shift(6.5*LEFT+3.5*UP))
+        axes.add(tex('c', color=RED).shift(2.6*DOWN+0.5*RIGHT))
         # axes.align_to(, direction=RIGHT)
         self.play(Write(axes, lag_ratio=0.01, run_time=1))
 
-        # Axes.get_graph will return the graph of a function
-        ekin_rel_graph = axes.get_graph(
-            lambda x: 1.0/np.sqrt(1.0-np.power(x, 2))-1.0 if x < 1.0 else 10.0,
-            color=GREEN,
-            x_range=(0.0, 1.0, 0.001)
-        )
-        ekin_classic_graph = axes.get_graph(
-            lambda x: np.power(x, 2)/2,
-            color=BLUE,
-        )
-        ekin_approx_graph1 = axes.get_graph(
-            lambda x: np.power(x, 2)/2,
-            color=YELLOW,
-        )
-        ekin_approx_graph2 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4),
-            color=YELLOW,
-        )
-        ekin_approx_graph3 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4)
-            + 5/16*np.power(x, 6),
-            color=YELLOW,
-        )
-        ekin_approx_graph4 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4)
-            + 5/16*np.power(x, 6) + 35/128*np.power(x, 8),
-            color=YELLOW,
-        )
-        ekin_approx_graph5 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4)
-            + 5/16*np.power(x, 6) + 35/128*np.power(x, 8)
-            + 63/256*np.power(x, 10),
-            color=YELLOW,
-        )
-        ekin_approx_graph6 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4)
-            + 5/16*np.power(x, 6) + 35/128*np.power(x, 8)
-            + 63/256*np.power(x, 10) + 231/1024*np.power(x, 12),
-            color=YELLOW,
-        )
-        ekin_approx_graph7 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4)
-            + 5/16*np.power(x, 6) + 35/128*np.power(x, 8)
-            + 63/256*np.power(x, 10) + 231/1024*np.power(x, 12)
-            + 429/2048*np.power(x, 14),
-            color=YELLOW,
-        )
-        ekin_approx_graph8 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4)
-            + 5/16*np.power(x, 6) + 35/128*np.power(x, 8)
-            + 63/256*np.power(x, 10) + 231/1024*np.power(x, 12)
-            + 429/2048*np.power(x, 14) + 6435/32768*np.power(x, 16),
-            color=YELLOW,
-        )
-        ekin_approx_graph9 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4)
-            + 5/16*np.power(x, 6) + 35/128*np.power(x, 8)
-            + 63/256*np.power(x, 10) + 231/1024*np.power(x, 12)
-            + 429/2048*np.power(x, 14) + 6435/32768*np.power(x, 16)
-            + 12155/65536*np.power(x, 18),
-            color=YELLOW,
-        )
-        ekin_approx_graph10 = axes.get_graph(
-            lambda x: np.power(x, 2)/2 + 3/8*np.power(x, 4)
-            + 5/16*np.power(x, 6) + 35/128*np.power(x, 8)
-            + 63/256*np.power(x, 10) + 231/1024*np.power(x, 12)
-            + 429/2048*np.power(x, 14) + 6435/32768*np.power(x, 16)
-            + 12155/65536*np.power(x, 18) + 46189/262144*np.power(x, 20),
-            color=YELLOW,
-        )
+        # Graphs are sampled from vectorized functions (and cached),
+        # the key of every graph has the sources of its functions
+        x_rel = (0.0, 1.0, 0.001)
+        ekin_rel_graph = cached_graph(
+            axes, ("ekin_rel", x_rel, source_key(kinetic_energy)),
+            lambda: (np.append(np.arange(*x_rel), 1.0),
+                     kinetic_energy(np.append(np.arange(*x_rel), 1.0))),
+            color=GREEN)
+
+        # Classic energy and its relativistic corrections: all partial sums
+        # of the series are sampled at once, only if some graph is missing
+        xs = np.arange(0.0, 2.0 + APPROX_STEP / 2, APPROX_STEP)
+        series_key = source_key(
+            kinetic_energy_approximations, kinetic_energy_coefficients,
+            partial_sums)
+        ekin_approx = []
+
+        def approx(k):  # samples of approximation k
+            if not ekin_approx:
+                ekin_approx.extend(kinetic_energy_approximations(N_APPROX, xs))
+            return xs, ekin_approx[k]
+
+        ekin_classic_graph = cached_graph(
+            axes, ("ekin_approx", 0, APPROX_STEP, series_key),
+            lambda: approx(0), color=BLUE)
         ekin_approx_graph = [
-            ekin_approx_graph1,
-            ekin_approx_graph2,
-            ekin_approx_graph3,
-            ekin_approx_graph4,
-            ekin_approx_graph5,
-            ekin_approx_graph6,
-            ekin_approx_graph7,
-            ekin_approx_graph8,
-            ekin_approx_graph9,
-            ekin_approx_graph10
-        ]
+            cached_graph(
+                axes, ("ekin_approx", k, APPROX_STEP, series_key),
+                lambda k=k: approx(k), color=YELLOW)
+            for k in range(N_APPROX)]
 
         edge_graph = axes.get_v_line(
             axes.input_to_graph_point(1, ekin_rel_graph),
@@ -113,20 +119,21 @@ class KinEnApprox(Scene):
         # ekin_rel_label = axes.get_graph_label(ekin_rel_graph, "\\sin(x)")
         ekin_rel_label = axes.get_graph_label(
             ekin_rel_graph,
-            "m_0c^2\\left(\\frac{1}{\\sqrt{1-\\frac{v^2}{c^2}}} - 1\\right)",
+            tex("m_0c^2\\left(\\frac{1}{\\sqrt{1-\\frac{v^2}{c^2}}}"
+                " - 1\\right)"),
             x=0.9)
         ekin_classic_label = axes.get_graph_label(
-            ekin_classic_graph, "\\frac{1}{2}m_0v^2", x=1.5)
+            ekin_classic_graph, tex("\\frac{1}{2}m_0v^2"), x=1.5)
         ekin_approx_label = []
 
-        for i in range(10):
+        for i in range(N_APPROX):
             ekin_approx_label.append(
                 axes.get_graph_label(
                     ekin_approx_graph[i],
-                    Text(
-                        f"Approximation {i+1}",
-                        color=YELLOW,
-                        size=28),
+                    cached_label(
+                        ("Text", f"Approximation {i+1}", 28),
+                        lambda i=i: Text(f"Approximation {i+1}", size=28),
+                        color=YELLOW),
                     x=0.5, color=YELLOW))
 
         self.play(
@@ -142,11 +149,11 @@ class KinEnApprox(Scene):
         )
         self.wait(5)
         self.play(
-            ShowCreation(ekin_approx_graph1),
+            ShowCreation(ekin_approx_graph[0]),
             FadeIn(ekin_approx_label[0])
         )
 
-        for i in range(9):
+        for i in range(N_APPROX - 1):
             self.wait(2)
             self.play(
                 ReplacementTransform(
@@ -9,8 +9,30 @@
 # GlowScript 3.1 VPython
 
 # import vpython as vp
-from vpython import canvas, vector, rate, cos, sin, arrow, label,\
-    color, cross, slider, button, sphere, wtext, pi, cylinder, pow, sqrt
+import asyncio
+
+from tracker import headless
+
+if headless.enabled():  # no browser, see tracker/headless.py
+    from tracker.headless import canvas, vector, cos, sin, arrow, label,\
+        color, cross, slider, button, sphere, wtext, pi, cylinder, pow, curve
+else:
+    from vpython import canvas, vector, cos, sin, arrow, label,\
+        color, cross, slider, button, sphere, wtext, pi, cylinder, pow, curve
+
+from tracker.adaptive import AdaptiveEnsemble
+from tracker.analytic import UniformFieldOrbit
+from tracker.beams import track
+from tracker.geometry import Cylinder
+from tracker.instruments import Instruments
+from tracker.integrators import ADAPTIVE, C_LIGHT, get_integrator,\
+    half_step, next_integrator, to_array
+from tracker.lod import SceneDetail, in_view
+from tracker.loop import frame_step
+from tracker.params import Parameters
+from tracker.replay import Playback, Recorder, Trajectory
+from tracker.tasks import Scheduler
+from tracker.trails import Trail
 
 # Create scene
 scene = canvas(
@@ -21,17 +43,31 @@ scene = canvas(
 # Pipe
 pipe = cylinder(
     pos=vector(0, 0, 0), axis=vector(200, 0, 0), opacity=0.1, radius=100)
-
-dt = 0.001  # time step
+aperture = Cylinder(pipe.length, pipe.radius, pipe.pos)  # for ensembles
+
+# time step of every integrator: Boris is second order, with 0.01 its
+# largest distance to the exact orbit is 11 times smaller than Euler's
+# with 0.001 (b = 10, theta = 30, reference_error in tracker/analytic.py).
+# A launch stops at the first step past the wall, so its wall hit is off
+# by up to a step: 0.04 for Boris, 0.3 for Euler. Adaptive steps take it
+# only for the time of frames
+time_steps = dict(euler=0.001, boris=0.01, boris_rel=0.01, adaptive=0.001)
+fps = 30  # rendered frames per second
+# steps per frame (None - as fast as CPU) and time step of the current
+# integrator, rounded so that every integrator covers 1 / fps per frame
+substeps, dt = frame_step(time_steps["euler"], fps)
+rtol = 1e-6  # tolerance of adaptive steps, instead of dt
+label_every = 3  # rendered frames between label moves
 
 
 # Create class for proton
 class Particle:
-    def __init__(self):  # v is a vector representing velocity
+    def __init__(self, body_color=color.blue):  # colour of sphere and trail
 
         # starting position vector of proton
         self.position = vector(pipe.pos.x + 10, pipe.pos.y, pipe.pos.z)
-        self.moving = False  # state to close loops
+        self.r_vec = vector(self.position)  # current position of particle
+        self.t = 0  # time since start
         self.theta = 0  # 0 .. 180
         self.phi = 0  # 0 ... 360
 
@@ -49,10 +85,22 @@ class Particle:
         self.b_vec = vector(-self.b_mag, 0, 0)  # magnetic field
         self.e_vec = vector(self.e_mag, 0, 0)  # electric field
         self.a = vector(0, 0, 0)  # acceleration from electromagnetic field
+        self.field = None  # field source (tracker/fields.py) or uniform
+
+        self.ensemble = None  # ensemble shown by this particle, if attached
+        self.index = 0  # index of the shown member of ensemble
+
+        self.integrator = "euler"  # "euler", "boris", "boris_rel", "adaptive"
+        self.c = C_LIGHT  # speed of light for relativistic integrator
+        self.stepper = None  # adaptive steps of the launch, if adaptive
+        self.leapfrog = None  # (vel, dt, velocity dt/2 earlier) of push()
+        self.recorder = None  # writes trajectory while recording
+        self.task = None  # launch of this particle, see tracker/tasks.py
 
         self.body = sphere(
-            pos=self.position, color=color.blue,
-            radius=2, make_trail=True, trail_type="curve")
+            pos=self.position, color=body_color,
+            radius=2, make_trail=False)
+        self.trail = Trail(curve(color=self.body.color))  # bounded trail
 
         # Draw vectors as arrows
         self.v_arrow = arrow(
@@ -93,224 +141,511 @@ class Particle:
             height=16, border=4,
             font='sans', color=self.f_arrow.color)
 
-    def move(self):  # moves proton by small step dx
+        # arrows with their axes; scene updates of hidden, off-screen
+        # arrows and labels are skipped (tracker/lod.py)
+        self.vectors = [
+            (vec, self.arrow_state(axis), self.label_state(axis))
+            for vec, axis in [
+                (self.v_arrow, lambda: self.v_vec),
+                (self.b_arrow, lambda: self.b_vec),
+                (self.e_arrow, lambda: self.q * self.e_vec),
+                (self.f_arrow, lambda: self.a)]]
+        self.detail = SceneDetail(label_every)
+
+    def move(self):  # moves proton by small step dx (no scene updates)
+        if self.integrator != "euler" or self.field is not None:
+            self.push()
+            return
+
         # electric + magnetic field forces F = ma = q (E + v x B)
         self.a = self.q * (self.e_vec + cross(self.v_vec, self.b_vec))
         self.a /= self.m
 
         self.v_vec += self.a * dt  # a = dv/dt
-        self.v_arrow.axis = self.v_vec  # a = dv/dt
 
-        self.f_arrow.axis = self.a
-
-        # Move body of particle and vectors by dx: v = dx/dt
-        self.body.pos += self.v_vec * dt
-        for vec in [self.v_arrow, self.b_arrow, self.e_arrow, self.f_arrow]:
-            vec.pos = self.body.pos
-            vec.label.pos = vec.pos + vec.axis
-
-        # for vec in []
+        # Move particle by dx: v = dx/dt
+        self.r_vec += self.v_vec * dt
+        self.t += dt
+
+    def push(self):  # moves particle by small step with chosen integrator
+        step = get_integrator(self.integrator)
+        pos, vel = to_array(self.r_vec), to_array(self.v_vec)
+        e, b = self.fields(pos)
+        qm = self.q / self.m
+        half = self.leapfrog_velocity(step, vel, qm, e, b)
+        pos, half, a = step(pos, half, qm, e, b, dt, self.c)
+        vel = half_step(step, half, qm, e, b, dt, self.c)
+        self.leapfrog = (vel, dt, half)
+        self.r_vec = vector(*pos)
+        self.v_vec = vector(*vel)
+        self.a = vector(*a)
+        self.t += dt
+
+    def leapfrog_velocity(self, step, vel, qm, e, b):
+        # velocity half a step back: of the last push, unless the
+        # velocity or dt changed since (reset, sliders, integrator)
+        if self.leapfrog is not None:
+            last, last_dt, half = self.leapfrog
+            if last_dt == dt and (last == vel).all():
+                return half
+        return half_step(step, vel, qm, e, b, -dt, self.c)
+
+    def start_adaptive(self):  # adaptive stepper from the current state
+        self.stepper = AdaptiveEnsemble(
+            self.r_vec, self.v_vec, self.q / self.m, self.e_vec, self.b_vec,
+            self.field, aperture, rtol=rtol, atol=rtol, t=self.t)
+
+    def advance(self, duration):  # adaptive steps over duration, dense output
+        self.stepper.set_fields(
+            self.q / self.m, self.e_vec, self.b_vec, self.field)
+        self.stepper.advance_to(self.t + duration)
+        t = min(self.t + duration, self.stepper.t[0])  # wall hit: at wall
+        self.load_state(t, *(x[:, 0] for x in self.stepper.state_at(t)))
+
+    def running(self):  # inside the pipe, adaptive: wall not reached
+        return self.check_collision() and (
+            self.stepper is None or self.t < self.stepper.t[0]
+            or bool(self.stepper.alive[0]))
+
+    def fields(self, pos):  # (e, b) arrays at position pos
+        if self.field is None:
+            return to_array(self.e_vec), to_array(self.b_vec)
+        e, b = self.field.fields(pos.reshape(3, 1))
+        return e[:, 0], b[:, 0]
+
+    def render(self):  # moves body and vectors and grows the trail
+        self.render_body()
+        self.render_trail()
+
+    def render_body(self):  # moves body and vectors, once per frame
+        self.body.pos = self.r_vec
+        self.render_vectors()
+        self.detail.tick()
+
+    def render_trail(self):  # adds the current position to the trail
+        self.trail.add(self.r_vec)
+
+    def render_vectors(self, now=False):  # arrows and labels seen, or all
+        for vec, arrow_state, label_state in self.vectors:
+            self.detail.update(vec, arrow_state, where=self.body)
+            self.detail.update(
+                vec.label, label_state, label=True, where=self.body)
+        if now:  # labels not due, off-screen arrows
+            self.detail.catch_up()
+
+    def arrow_state(self, axis):  # attributes of an arrow from its axis
+        return lambda: dict(pos=self.r_vec, axis=axis())
+
+    def label_state(self, axis):  # attributes of the label of an arrow
+        return lambda: dict(pos=self.r_vec + axis())
+
+    def attach(self, ensemble, index=0):  # shows member of ensemble
+        self.ensemble = ensemble
+        self.index = index
+        self.sync()
+        self.render()
+
+    def detach(self):  # particle moves by itself again
+        self.ensemble = None
+
+    def sync(self):  # copies state of ensemble member to the particle
+        self.load_state(self.ensemble.t, *self.ensemble.state(self.index))
+
+    def load_state(self, t, pos, vel, a):  # sets state from arrays
+        self.t = t
+        self.r_vec = vector(*pos)
+        self.v_vec = vector(*vel)
+        self.a = vector(*a)
+
+    def parameters(self):  # launch parameters, stored with recordings
+        return dict(
+            script="Lec01_movement", dt=dt, integrator=self.integrator,
+            q=self.q, m=self.m, v_mag=self.v_mag, e_mag=self.e_mag,
+            b_mag=self.b_mag, theta=self.theta, phi=self.phi)
+
+    def record(self):  # adds current state to the recording
+        self.recorder.add(self.t, self.r_vec, self.v_vec, self.a)
+
+    def orbit(self):  # exact orbit from the current state (uniform fields)
+        return UniformFieldOrbit(
+            self.r_vec, self.v_vec, self.q / self.m,
+            self.e_vec, self.b_vec)
+
+    def exit_state(self, t_max=1000):  # (t, pos, vel) of wall hit or None
+        return self.orbit().exit_state(aperture, t_max)
 
     def reset(self):  # resets particle position and path
+        self.r_vec = vector(self.position)
+        self.t = 0
         self.body.pos = self.position
         self.v_vec = vector(
             self.v_mag*cos(self.theta),
             self.v_mag*sin(self.theta)*sin(self.phi),
             self.v_mag*sin(self.theta)*cos(self.phi))
-        self.body.clear_trail()
+        self.trail.clear()
+        self.trail.add(self.r_vec)
         self.a = vector(0, 0, 0)
-
-        for vec in [self.v_arrow, self.b_arrow, self.e_arrow, self.f_arrow]:
-            vec.pos = self.body.pos
-            vec.label.pos = vec.pos + vec.axis
-
-        self.v_arrow.axis = self.v_vec
-        self.b_arrow.axis = self.b_vec
+        self.render_vectors(now=True)
 
     def check_collision(self):  # checks for boundaries
-        if sqrt(
-            pow(self.body.pos.z, 2) + pow(self.body.pos.y, 2)) < pipe.radius \
-                and pipe.length > self.body.pos.x > 0:
+        if pow(self.r_vec.z, 2) + pow(self.r_vec.y, 2) < pow(pipe.radius, 2) \
+                and pipe.length > self.r_vec.x > 0:
             return True
         else:
             return False
 
 
 def to_start():
-    particle.moving = False
+    stop()
+    params.flush()  # reset from the latest slider values
+    for p in particles:
+        p.reset()
+
+
+def step(p=None):  # one physics step of a launched particle
+    p = p or particle
+    if p.ensemble is not None:  # whole beam in one step, by one view
+        if pusher(p.ensemble) is p:
+            p.ensemble.push(dt, p.e_vec, p.b_vec, aperture, p.field)
+        p.sync()
+    elif p.stepper is not None:  # adaptive steps over one frame time
+        p.advance(substeps * dt)
+    else:
+        p.move()
+    if p.recorder is not None:
+        p.record()
+
+
+def pusher(ensemble):  # first running launch showing ensemble pushes it
+    for p in particles:
+        if p.ensemble is ensemble and p.task is not None \
+                and p.task.state == "running":
+            return p
+    return None
+
+
+def render(p):  # views of a shared ensemble show its latest state
+    if p.ensemble is not None:
+        p.sync()
+    p.render_body()
+
+
+def launch(p=None, on_done=None):  # launch of particle as scheduler task
+    p = p or particle
+    if p.task is not None:
+        p.task.cancel()
+    p.stepper = None
+    if p.integrator == ADAPTIVE:
+        p.start_adaptive()
+    p.task = scheduler.launch(
+        lambda: step(p), lambda: render(p), p.running,
+        substeps=frame_steps(p),
+        name=f"particle {particles.index(p)}", on_done=on_done,
+        trail=p.render_trail)
+    scheduler.start()  # blocks only if no event loop drives the scheduler
+    return p.task
+
+
+def frame_steps(p):  # steps per frame: one adaptive step covers a frame
+    return 1 if p.stepper is not None else substeps
+
+
+def record(path):  # launches particle from start, recording to path
+    if particle.task is not None:  # its recording is closed first
+        particle.task.cancel()
+    params.flush()
     particle.reset()
+    recorder = Recorder(path, particle.parameters())
+
+    def done(task):  # closes this recording, not a later one
+        recorder.close()
+        if particle.recorder is recorder:
+            particle.recorder = None
+    particle.recorder = recorder
+    particle.record()
+    return launch(on_done=done)
+
+
+def track_beam(source, path, t_max=100):
+    # tracks a beam (tracker/beams.py) in the slider fields chunk by
+    # chunk, end states of survivors to path; no scene updates. With
+    # the integrator of the launches, adaptive ones to tolerance rtol
+    name = particle.integrator
+    params.flush()
+    return track(
+        source, path, time_steps[name], t_max, particle.e_vec,
+        particle.b_vec, particle.q, particle.m, name, aperture,
+        particle.field, rtol=rtol)
+
+
+def replay(path, start=0, speed=1):  # plays recording, no physics
+    if particle.task is not None:  # as a launch of the particle
+        particle.task.cancel()
+    particle.trail.clear()
+
+    def show(t, pos, vel, a):
+        particle.load_state(t, pos, vel, a)
+        particle.render()
+    playback = Playback(Trajectory(path), show, fps, start, speed)
+    particle.task = scheduler.launch(
+        playback.step, playback.render, playback.running, substeps=1,
+        name="replay")
+    scheduler.start()  # blocks only if no event loop drives the scheduler
+    return particle.task
 
 
-def launch():
-    particle.moving = True
-    while particle.check_collision() and particle.moving:
-        rate(1/dt)  # basically a delay function
-        particle.move()
+def stop():
+    scheduler.cancel()  # launches and replays
 
 
-def stop():
-    particle.moving = False
+def pause():  # pauses all launches, resumes them on the next press
+    if any(task.state == "running" for task in scheduler.tasks):
+        scheduler.pause()
+    else:
+        scheduler.resume()
+
+
+def follow_view(p):  # scene updates of p only if near the camera target
+    p.detail.on_screen = in_view(scene, particle.body)  # camera follows
+
+
+def addParticle():  # launches one more particle with the slider values
+    colors = [color.red, color.green, color.magenta, color.orange]
+    p = Particle(colors[(len(particles) - 1) % len(colors)])
+    p.integrator = particle.integrator
+    particles.append(p)
+    follow_view(p)
+    show_details(p)
+    update_all(p)
+    p.reset()
+    return launch(p)
+
+
+def set_integrator(name):  # integrator of all particles, own time step
+    global dt, substeps
+    substeps, dt = frame_step(time_steps[name], fps)  # same sim time
+    for p in particles:
+        p.integrator = name
+        p.stepper = None
+        if p.task is not None and not p.task.done:  # goes on from its state
+            if name == ADAPTIVE:
+                p.start_adaptive()
+            p.task.set_substeps(frame_steps(p))
+
+
+def switchIntegrator():
+    set_integrator(next_integrator(particle.integrator))
+    integratorButton.text = f"Integrator: {particle.integrator}"
+
+
+vectors_shown = True  # arrows of all particles, "Show Vectors"
+labels_shown = True  # labels of all arrows, "Show Labels"
+
+
+def show_details(p):  # arrows and labels of p as the buttons say
+    for vec, _, _ in p.vectors:
+        if p.detail.shown(vec) != vectors_shown:
+            p.detail.show(vec, vectors_shown,
+                          opacity=0.7 if vectors_shown else 0)
+        if p.detail.shown(vec.label) != labels_shown:
+            p.detail.show(vec.label, labels_shown, visible=labels_shown)
 
 
 def showVectors():
-    for vec in [
-            particle.v_arrow,
-            particle.b_arrow, particle.e_arrow, particle.f_arrow]:
-        if vec.opacity != 0:
-            vec.opacity = 0
-        else:
-            vec.opacity = 0.7
+    global vectors_shown
+    vectors_shown = not vectors_shown
+    for p in particles:
+        show_details(p)
 
 
 def showLabels():
-    for vec in [
-            particle.v_arrow,
-            particle.b_arrow, particle.e_arrow, particle.f_arrow]:
-        if vec.label.visible:
-            vec.label.visible = False
-        else:
-            vec.label.visible = True
+    global labels_shown
+    labels_shown = not labels_shown
+    for p in particles:
+        show_details(p)
 
 
-def adjustBfield():
-    particle.b_mag = BfieldSlider.value
-    particle.b_vec = vector(-BfieldSlider.value, 0, 0)  # B directed downwards
-    particle.b_arrow.axis = particle.b_vec
-    particle.b_arrow.label.pos = particle.b_arrow.pos + particle.b_arrow.axis
-    BfieldSliderReadout.text = f"{BfieldSlider.value} Tesla"
+# Sliders only store their values; the particle, its arrows and the
+# readouts are updated from the changed values once per frame (flush)
+params = Parameters(b=0, e=0, q=0.5, m=1, theta=0, phi=0)
 
-    particle.a = particle.q * (
-            particle.e_vec + cross(particle.v_vec, particle.b_vec))
-    particle.a /= particle.m
-    particle.f_arrow.axis = particle.a
-    particle.f_arrow.label.pos = particle.f_arrow.pos + particle.f_arrow.axis
 
+def adjustBfield():
+    params.set("b", BfieldSlider.value)
 
-def adjustEfield():
-    particle.e_mag = EfieldSlider.value
-    particle.e_vec = vector(EfieldSlider.value, 0, 0)
-    particle.e_arrow.axis = particle.q * particle.e_vec
-    particle.e_arrow.label.pos = particle.e_arrow.pos + particle.e_arrow.axis
-    EfieldSliderReadout.text = f"{EfieldSlider.value} V"
 
-    particle.a = \
-        particle.e_arrow.axis + particle.q * cross(
-            particle.v_vec, particle.b_vec)
-    particle.a /= particle.m
-    particle.f_arrow.axis = particle.a
-    particle.f_arrow.label.pos = particle.f_arrow.pos + particle.f_arrow.axis
+def adjustEfield():
+    params.set("e", EfieldSlider.value)
 
 
 def adjustQ():
-    particle.q = QSlider.value
-    particle.e_arrow.axis = particle.q * particle.e_vec
-    particle.e_arrow.label.pos = particle.e_arrow.pos + particle.e_arrow.axis
-    QSliderReadout.text = f"{QSlider.value} Coulumbs"
-
-    particle.a = particle.q * (
-            particle.e_vec + cross(particle.v_vec, particle.b_vec))
-    particle.a /= particle.m
-    particle.f_arrow.axis = particle.a
-    particle.f_arrow.label.pos = particle.f_arrow.pos + particle.f_arrow.axis
+    params.set("q", QSlider.value)
 
 
 def adjustM():
-    particle.m = MSlider.value
-    MSliderReadout.text = f"{MSlider.value} units"
-    particle.body.radius = 2 * particle.m
-
-    particle.a = particle.q * (
-            particle.e_vec + cross(particle.v_vec, particle.b_vec))
-    particle.a /= particle.m
-    particle.f_arrow.axis = particle.a
-    particle.f_arrow.label.pos = particle.f_arrow.pos + particle.f_arrow.axis
+    params.set("m", MSlider.value)
 
 
 def adjustPhi():
-    particle.phi = phiSlider.value * pi / 180  # degree - radian conversion
-    particle.v_vec = vector(
-        particle.v_mag * cos(particle.theta),
-        particle.v_mag * sin(particle.theta) * sin(particle.phi),
-        particle.v_mag * sin(particle.theta) * cos(particle.phi))
-    particle.v_arrow.axis = particle.v_vec
-    particle.v_arrow.label.pos = particle.v_arrow.pos + particle.v_arrow.axis
-    phiSliderReadout.text = f"{phiSlider.value} degrees"
-
-    particle.a = particle.q * (
-            particle.e_vec + cross(particle.v_vec, particle.b_vec))
-    particle.a /= particle.m
-    particle.f_arrow.axis = particle.a
-    particle.f_arrow.label.pos = particle.f_arrow.pos + particle.f_arrow.axis
+    params.set("phi", phiSlider.value)
 
 
 def adjustTheta():
-    theta = thetaSlider.value * pi / 180  # degree - radian conversion
-    particle.theta = theta
-    particle.v_vec = vector(
-        particle.v_mag * cos(particle.theta),
-        particle.v_mag * sin(particle.theta) * sin(particle.phi),
-        particle.v_mag * sin(particle.theta) * cos(particle.phi))
-    particle.v_arrow.axis = particle.v_vec
-    particle.v_arrow.label.pos = particle.v_arrow.pos + particle.v_arrow.axis
-    thetaSliderReadout.text = f"{thetaSlider.value} degrees"
-
-    particle.a = particle.q * (
-            particle.e_vec + cross(particle.v_vec, particle.b_vec))
-    particle.a /= particle.m
-    particle.f_arrow.axis = particle.a
-    particle.f_arrow.label.pos = particle.f_arrow.pos + particle.f_arrow.axis
+    params.set("theta", thetaSlider.value)
+
+
+def velocity(p):  # velocity vector from slider angles
+    theta = p["theta"] * pi / 180  # degree - radian conversion
+    phi = p["phi"] * pi / 180
+    return vector(
+        particle.v_mag * cos(theta),
+        particle.v_mag * sin(theta) * sin(phi),
+        particle.v_mag * sin(theta) * cos(phi))
+
+
+launch_velocity = params.derived({"theta", "phi"}, velocity)
+
+
+def update_fields(p):
+    p.b_mag = params["b"]
+    p.b_vec = vector(-params["b"], 0, 0)  # B directed downwards
+    p.e_mag = params["e"]
+    p.e_vec = vector(params["e"], 0, 0)
+
+
+def update_particle(p):
+    p.q = params["q"]
+    p.m = params["m"]
+    p.body.radius = 2 * p.m
+
+
+def update_velocity(p):
+    p.theta = params["theta"] * pi / 180
+    p.phi = params["phi"] * pi / 180
+    p.v_vec = vector(launch_velocity.value)
+    if p.stepper is not None and p.task is not None and not p.task.done:
+        p.start_adaptive()  # in flight: goes on with the new velocity
+
+
+def update_force(p):  # electric + magnetic field force, once per batch
+    p.a = p.q * (p.e_vec + cross(p.v_vec, p.b_vec))
+    p.a /= p.m
+
+
+def update_arrows(p):  # shown ones at once, hidden ones when shown
+    p.render_vectors(now=True)
+
+
+def update_readouts():
+    BfieldSliderReadout.text = f"{params['b']} Tesla"
+    EfieldSliderReadout.text = f"{params['e']} V"
+    QSliderReadout.text = f"{params['q']} Coulumbs"
+    MSliderReadout.text = f"{params['m']} units"
+    thetaSliderReadout.text = f"{params['theta']} degrees"
+    phiSliderReadout.text = f"{params['phi']} degrees"
+
+
+def update_all(p):  # a particle from all slider values
+    for update in (update_fields, update_particle, update_velocity,
+                   update_force, update_arrows):
+        update(p)
+
+
+def for_particles(update):  # watcher updating every particle
+    return lambda: [update(p) for p in particles]
+
+
+params.watch({"b", "e"}, for_particles(update_fields))  # in order
+params.watch({"q", "m"}, for_particles(update_particle))
+params.watch({"theta", "phi"}, for_particles(update_velocity))
+params.watch(params.values, for_particles(update_force))
+params.watch(params.values, for_particles(update_arrows))
+params.watch(params.values, update_readouts)
+
+
+def on_frame():  # first in every frame tick: slider changes, readout
+    params.flush()
+    if instruments.enabled and instruments.frames % fps == 0:
+        profileReadout.text = instruments.caption()
+
+
+def toggleProfile():  # timers of frame phases on / off
+    instruments.enabled = not instruments.enabled
+    instruments.reset()
+    profileButton.text = f"Profile: {'on' if instruments.enabled else 'off'}"
+    profileReadout.text = ""
+
+
+# One frame tick drives all launches, slider changes are applied first
+instruments = Instruments()  # instruments.save(path) writes JSON
+scheduler = Scheduler(
+    fps, on_frame=on_frame, paced=not headless.enabled(),
+    instruments=instruments)
+in_loop = scheduler.threadsafe  # widget callbacks run between ticks
 
 
 particle = Particle()  # creates the 'particle' object
+particles = [particle]  # all particles in the scene, see addParticle
 
 # Adjust initial camera
 scene.camera.pos = vector(7.6, 0.5, 67)
 scene.camera.axis = vector(0, 0, -67)
 scene.camera.follow(particle.body)
+follow_view(particle)  # as every added particle
 
 scene.append_to_caption("\n\n")  # newlines for aesthetics
-button(text="To start", bind=to_start)  # link the button and function
-button(text="Launch!", bind=launch)  # link the button and function
-button(text="Stop!", bind=stop)  # link the button and function
-button(text="Show Vectors", bind=showVectors)  # link the button and function
-button(text="Show Labels", bind=showLabels)  # link the button and function
+button(text="To start", bind=in_loop(to_start))
+button(text="Launch!", bind=in_loop(launch))
+button(text="Stop!", bind=in_loop(stop))
+button(text="Pause", bind=in_loop(pause))
+button(text="Add particle", bind=in_loop(addParticle))
+button(text="Show Vectors", bind=in_loop(showVectors))
+button(text="Show Labels", bind=in_loop(showLabels))
+integratorButton = button(
+    text=f"Integrator: {particle.integrator}", bind=in_loop(switchIntegrator))
+profileButton = button(text="Profile: off", bind=in_loop(toggleProfile))
+profileReadout = wtext(text="")  # frame rate and time per phase
 
 scene.append_to_caption("\n\n")  # newlines for aesthetics
 BfieldSlider = slider(
-    min=0, max=20, step=0.5, value=0, bind=adjustBfield)
+    min=0, max=20, step=0.5, value=0, bind=in_loop(adjustBfield))
 scene.append_to_caption(" B-field (magnetic) Strength = ")
 BfieldSliderReadout = wtext(text=f"{BfieldSlider.value} Tesla")
 
 scene.append_to_caption("\n\n")  # newlines for aesthetics
 EfieldSlider = slider(
-    min=-50, max=50, step=1, value=0, bind=adjustEfield)
+    min=-50, max=50, step=1, value=0, bind=in_loop(adjustEfield))
 scene.append_to_caption(" E-field (electric) Strength = ")
 EfieldSliderReadout = wtext(text=f"{EfieldSlider.value} V")
 
 # Adjust charge Q
 scene.append_to_caption("\n\n")
 QSlider = slider(
-    min=0, max=1, step=0.1, value=0.5, bind=adjustQ)
+    min=0, max=1, step=0.1, value=0.5, bind=in_loop(adjustQ))
 scene.append_to_caption(" Q (charge) = ")
 QSliderReadout = wtext(text=f"{QSlider.value} Coulumbs")
 
 # Adjust mass M
 scene.append_to_caption("\n\n")
 MSlider = slider(
-    min=0.1, max=1, step=0.1, value=1, bind=adjustM)
+    min=0.1, max=1, step=0.1, value=1, bind=in_loop(adjustM))
 scene.append_to_caption(" M (mass) = ")
 MSliderReadout = wtext(text=f"{MSlider.value} units")
 
 # Adjust angle theta
 scene.append_to_caption("\n\n")
 thetaSlider = slider(
-    min=0, max=180, step=30, value=0, bind=adjustTheta)
+    min=0, max=180, step=30, value=0, bind=in_loop(adjustTheta))
 scene.append_to_caption(" Theta angle = ")
 thetaSliderReadout = wtext(text=f"{thetaSlider.value} degrees")
 
 # Adjust angle phi
 scene.append_to_caption("\n\n")
 phiSlider = slider(
-    min=0, max=360, step=30, value=0, bind=adjustPhi)
+    min=0, max=360, step=30, value=0, bind=in_loop(adjustPhi))
 scene.append_to_caption(" Phi angle = ")
 phiSliderReadout = wtext(text=f"{phiSlider.value} degrees")
+
+if __name__ == "__main__" and not headless.enabled():
+    # scheduler ticks forever: slider changes, launches started by buttons
+    asyncio.run(scheduler.serve(forever=True))
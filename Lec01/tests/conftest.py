@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+# Tests of the tracker package, run from Lec01 (as the scripts):
+#     cd Lec01
+#     python -m pytest -q tests
+# Lec01 is put on the path, so `tracker` imports as in the scripts.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
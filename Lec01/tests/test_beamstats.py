@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+# Streaming moments (beamstats.py): batches merged by Chan's pairwise
+# update give the mean and covariance of a single pass over all samples.
+
+import numpy as np
+
+from tracker.beamstats import Moments, stack, unstack
+
+
+def samples(n=5000, k=7):  # correlated samples, far from the origin
+    rng = np.random.default_rng(5)
+    mix = rng.normal(size=(k, k))
+    return 1e3 + mix @ rng.normal(size=(k, n))
+
+
+def test_merged_batches_equal_single_pass():
+    data = samples()
+    merged = Moments()
+    for batch in np.array_split(data, [1, 7, 100, 101, 2500, 4000], axis=1):
+        merged.add(batch)
+    single = Moments()
+    single.add(data)
+
+    assert merged.n == single.n == data.shape[1]
+    np.testing.assert_allclose(merged.mean, data.mean(axis=1), rtol=1e-13)
+    np.testing.assert_allclose(merged.cov, np.cov(data, bias=True),
+                               rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(merged.m2, single.m2, rtol=1e-9, atol=1e-9)
+
+
+def test_empty_batches_and_state_round_trip():
+    data = samples(200)
+    moments = Moments()
+    moments.add(data[:, :0])
+    assert moments.n == 0 and np.isnan(moments.cov).all()
+    moments.add(data)
+    restored, = unstack(stack([moments]))
+    assert restored.n == moments.n
+    np.testing.assert_array_equal(restored.mean, moments.mean)
+    np.testing.assert_array_equal(restored.m2, moments.m2)
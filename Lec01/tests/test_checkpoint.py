@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# Resumed runs (checkpoint.py) give the same bits as uninterrupted ones:
+# a run is killed right after one of its snapshots and started again
+# with fresh objects, as a restarted job would be.
+
+import numpy as np
+import pytest
+
+from tracker.beamstats import StationMonitor, TimeMonitor
+from tracker.checkpoint import Checkpoint, run
+from tracker.ensemble import Ensemble
+from tracker.geometry import Cylinder
+from tracker.lattice import Lattice, drift_map, uniform_field_map
+from tracker.spacecharge import SpaceCharge
+
+E_VEC, B_VEC = (0.2, 0, 0), (-2.0, 0, 0.5)
+DT, N_STEPS = 0.01, 60
+
+
+class Killed(Exception):
+    pass
+
+
+class KilledCheckpoint(Checkpoint):  # dies right after its n-th snapshot
+    def __init__(self, path, every, n):
+        super().__init__(path, every=every)
+        self.n = n
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.saves == self.n:
+            raise Killed
+
+
+def beam(integrator, n=400):  # ensemble and monitors, always the same
+    rng = np.random.default_rng(7)
+    pos = rng.normal(0, 0.5, (3, n))
+    pos[0] += 1
+    vel = rng.normal(0, 0.5, (3, n))
+    vel[0] += 5
+    ens = Ensemble.from_arrays(pos, vel, 0.5, 1.0)
+    ens.integrator = integrator
+    ens.monitors = [StationMonitor(np.linspace(0, 4, 9)), TimeMonitor(0.05)]
+    return ens
+
+
+def killed_and_resumed(make, tmp_path, every, n, **kwargs):
+    # ensemble of a run killed after n snapshots and run again
+    path = str(tmp_path / "run.ckpt.npz")
+    ens, field = make()
+    with pytest.raises(Killed):
+        run(ens, N_STEPS, DT, E_VEC, B_VEC, checkpoint=KilledCheckpoint(
+            path, every, n), field=field, **kwargs)
+    ens, field = make()
+    return run(ens, N_STEPS, DT, E_VEC, B_VEC, field=field,
+               checkpoint=Checkpoint(path, every=every), **kwargs)
+
+
+def assert_same(a, b):  # bit-identical particles, losses and monitors
+    for name in ("pos", "vel", "ids"):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+    assert a.t == b.t and a.steps == b.steps
+    lost_a, lost_b = a.lost_particles(), b.lost_particles()
+    for key in lost_a:
+        np.testing.assert_array_equal(lost_a[key], lost_b[key])
+    for ma, mb in zip(a.monitors, b.monitors):
+        sa, sb = ma.state(), mb.state()
+        for key in sa:
+            np.testing.assert_array_equal(sa[key], sb[key])
+
+
+@pytest.mark.parametrize("integrator", ["euler", "boris"])
+def test_resumed_ensemble_equals_uninterrupted(integrator, tmp_path):
+    aperture = Cylinder(4, 1.2)
+    ens = beam(integrator)
+    ens = run(ens, N_STEPS, DT, E_VEC, B_VEC, aperture)
+    assert len(ens.lost_particles()["id"])  # losses are checked too
+
+    resumed = killed_and_resumed(
+        lambda: (beam(integrator), None), tmp_path, 13, 2,
+        aperture=aperture)
+    assert_same(resumed, ens)
+
+
+def test_resumed_space_charge_equals_uninterrupted(tmp_path):
+    # grid every 3 pushes, snapshots every 7: resumed mid-interval
+    def make():
+        ens = beam("boris", n=300)
+        return ens, SpaceCharge(ens, shape=(16, 16, 16), interval=3)
+
+    ens, field = make()
+    ens = run(ens, N_STEPS, DT, E_VEC, B_VEC, field=field)
+    resumed = killed_and_resumed(make, tmp_path, 7, 2)
+    assert_same(resumed, ens)
+
+
+def test_resumed_lattice_equals_uninterrupted(tmp_path):
+    ring = Lattice([drift_map(0.3),
+                    uniform_field_map(1.0, (0, 0, 0), (0, 0, 1), 0.7)])
+    state = np.random.default_rng(1).normal(0, 1, (6, 20))
+    turns = ring.track(state, 600, every=2)
+
+    path = str(tmp_path / "ring.ckpt.npz")
+    with pytest.raises(Killed):
+        ring.track(state, 600, every=2,
+                   checkpoint=KilledCheckpoint(path, 50, 3))
+    resumed = ring.track(state, 600, every=2,
+                         checkpoint=Checkpoint(path, every=50))
+    np.testing.assert_array_equal(np.asarray(resumed), turns)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+# Wall crossings of the apertures (geometry.py): the face a straight
+# step leaves through, the fraction of the step, and the point.
+
+import numpy as np
+import pytest
+
+from tracker.geometry import Box, Composite, Cylinder, interpolate
+
+
+def steps(*pairs):  # (p0, p1) columns of (start, end) points
+    p0 = np.array([p for p, _ in pairs], float).T
+    p1 = np.array([q for _, q in pairs], float).T
+    return p0, p1
+
+
+def test_box_crossing():
+    box = Box(2, 4, 6, center=(1, 0, 0))  # x 0 .. 2, y -2 .. 2, z -3 .. 3
+    p0, p1 = steps(
+        ((1, 0, 0), (3, 0, 0)),  # +x at 2
+        ((1, 0, 0), (1, -6, 0)),  # -y at -2
+        ((1, 0, 0), (1, 0, 4)),  # +z at 3
+        ((1.5, 1, 0), (-0.5, 3, 0)))  # +y and -x, +y first
+    s, face = box.crossing(p0, p1)
+    np.testing.assert_allclose(s, [0.5, 1 / 3, 0.75, 0.5])
+    np.testing.assert_array_equal(face, [1, 2, 5, 3])
+    np.testing.assert_allclose(
+        interpolate(p0, p1, s)[:, 3], [0.5, 2, 0], atol=1e-15)
+
+
+def test_cylinder_crossing():
+    pipe = Cylinder(10, 1, start=(0, 0, 0))
+    p0, p1 = steps(
+        ((1, 0, 0), (-1, 0, 0)),  # entrance plane
+        ((9, 0, 0), (11, 0, 0)),  # exit plane
+        ((5, 0, 0), (5, 0.6, 0.8)),  # wall, |(y, z)| = 1 at the end
+        ((5, 0, 0), (5, 2, 0)))  # wall halfway
+    s, face = pipe.crossing(p0, p1)
+    np.testing.assert_allclose(s, [0.5, 0.5, 1, 0.5])
+    np.testing.assert_array_equal(face, [0, 1, 2, 2])
+    hit = interpolate(p0, p1, s)
+    assert np.hypot(hit[1, 2:], hit[2, 2:]) == pytest.approx(1)
+
+
+def test_composite_crossing():
+    # pipe (faces 0 .. 2) with a box of x 3 .. 7 (faces 3 .. 8) around
+    # its middle; only apertures the step really leaves count
+    ap = Composite(Cylinder(10, 1), Box(4, 10, 10, center=(5, 0, 0)))
+    assert ap.faces == 9
+    p0, p1 = steps(
+        ((5, 0, 0), (5, 2, 0)),  # pipe wall, box not left
+        ((5, 0, 0), (8, 0, 0)),  # box +x at 7, pipe not left
+        ((5, 0, 0), (9, 0, 1.2)))  # box +x at s = 1/2, wall later
+    s, face = ap.crossing(p0, p1)
+    np.testing.assert_allclose(s, [0.5, 2 / 3, 0.5])
+    np.testing.assert_array_equal(face, [2, 4, 4])
+    assert not ap.inside(p1).any() and ap.inside(p0).all()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+# Orders of the integrators against the exact orbit of uniform fields
+# (analytic.UniformFieldOrbit through reference_error): halving dt
+# halves the error of Euler and quarters the one of Boris (leapfrog).
+
+import numpy as np
+import pytest
+
+from tracker.analytic import reference_error
+from tracker.integrators import boris, boris_relativistic, euler
+
+POS, VEL = (0, 0, 0), (1.0, 0.5, 0.2)
+QM, E_VEC, B_VEC = 1.0, (0.5, 0, 0.1), (0, 0.3, 2.0)
+DURATION = 2.0
+
+
+def error(integrator, dt):  # largest distance to the exact orbit
+    return reference_error(integrator, np.array(POS, float),
+                           np.array(VEL, float), QM, E_VEC, B_VEC, dt,
+                           int(round(DURATION / dt)), c=1e6)
+
+
+@pytest.mark.parametrize("integrator, dt, order", [
+    (euler, 1e-3, 1),
+    (boris, 1e-2, 2),
+    (boris_relativistic, 1e-2, 2)])
+def test_error_shrinks_at_order(integrator, dt, order):
+    coarse, fine = error(integrator, dt), error(integrator, dt / 2)
+    assert fine < coarse
+    assert np.log2(coarse / fine) == pytest.approx(order, abs=0.1)
+
+
+def test_boris_beats_euler_at_larger_step():
+    assert error(boris, 1e-2) < error(euler, 1e-3)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+# ShardedEnsemble (sharded.py) pushes as Ensemble does: survivors,
+# their states and the lost-particle records match to rounding, also
+# over several runs, the last with another step (leapfrog restart).
+
+import numpy as np
+import pytest
+
+from tracker.ensemble import Ensemble
+from tracker.fields import Dipole
+from tracker.geometry import Cylinder
+from tracker.sharded import ShardedEnsemble
+
+E_VEC, B_VEC = (0.2, 0, 0), (-2.0, 0, 0.5)
+DTS = (0.01, 0.01, 0.02)  # steps of the runs
+
+
+def by_id(ids, *arrays):  # arrays in order of particle ids
+    order = np.argsort(ids)
+    return [a[..., order] for a in arrays]
+
+
+@pytest.mark.parametrize("integrator", ["euler", "boris"])
+@pytest.mark.parametrize("field", [None, Dipole((0, 1.5, 0), 3, 1, 0.5)])
+def test_sharded_matches_ensemble(integrator, field):
+    rng = np.random.default_rng(3)
+    pos = rng.normal(0, 0.5, (3, 3000))
+    vel = rng.normal(0, 0.5, (3, 3000))
+    vel[0] += 5
+    aperture = Cylinder(6, 1.5, start=(-2, 0, 0))
+
+    ens = Ensemble.from_arrays(pos, vel, 0.5, 1.0)
+    ens.integrator = integrator
+    for dt in DTS:
+        ens.run(30, dt, E_VEC, B_VEC, aperture, field)
+
+    with ShardedEnsemble.from_arrays(pos, vel, 0.5, 1.0, integrator,
+                                     workers=3) as beam:
+        for dt in DTS:
+            beam.run(30, dt, E_VEC, B_VEC, aperture, field)
+        state, lost = beam.arrays(), beam.lost_particles()
+        assert beam.n == ens.n and 0 < ens.n < 3000
+
+    expected = by_id(ens.ids, ens.pos, ens.vel)
+    for a, b in zip(by_id(state["ids"], state["pos"], state["vel"]),
+                    expected):
+        np.testing.assert_allclose(a, b, rtol=0, atol=1e-12)
+    ens_lost = ens.lost_particles()
+    np.testing.assert_array_equal(np.sort(lost["id"]),
+                                  np.sort(ens_lost["id"]))
+    for key in ("t", "pos", "vel", "face"):
+        a, = by_id(lost["id"], lost[key])
+        b, = by_id(ens_lost["id"], ens_lost[key])
+        np.testing.assert_allclose(a, b, rtol=0, atol=1e-12)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+# Self-field of a uniformly charged sphere by particle-in-cell
+# (spacecharge.py) against Gauss's law: E = Q r / (4 pi eps0 R^3)
+# inside, Q / (4 pi eps0 r^2) outside; not at the (smeared) surface.
+
+import numpy as np
+import pytest
+
+from tracker.ensemble import Ensemble
+from tracker.spacecharge import SpaceCharge
+
+N, RADIUS, CHARGE = 100000, 1.0, 1.0
+
+
+def gauss(r):  # radial field of the sphere, eps0 = 1
+    return np.where(r < RADIUS, CHARGE * r / RADIUS**3,
+                    CHARGE / r**2) / (4 * np.pi)
+
+
+@pytest.fixture(scope="module")
+def space_charge():
+    rng = np.random.default_rng(0)
+    u = rng.normal(size=(3, N))
+    u /= np.linalg.norm(u, axis=0)
+    pos = u * RADIUS * rng.uniform(size=N) ** (1 / 3)
+    ens = Ensemble.from_arrays(pos, np.zeros((3, N)), CHARGE / N, 1.0)
+    sc = SpaceCharge(ens, shape=(32, 32, 32), margin=0.5, magnetic=False)
+    sc.update()
+    return sc
+
+
+@pytest.mark.parametrize("direction", [
+    (1, 0, 0), (0, 1, 0), (0, 0, -1), (1, 1, 1), (1, -2, 0.5)])
+def test_sphere_field_follows_gauss(space_charge, direction):
+    u = np.array(direction, float) / np.linalg.norm(direction)
+    r = np.array([0.3, 0.5, 0.7, 1.2, 1.5]) * RADIUS
+    e, b = space_charge.grid.fields(u[:, np.newaxis] * r)
+    np.testing.assert_allclose(u @ e, gauss(r), rtol=0.04)
+    transverse = e - np.outer(u, u @ e)
+    assert np.abs(transverse).max() < 0.04 * gauss(r).max()
+    assert not b.any()
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+# Headless tracking engine for the lecture 1 visualizations
+# (many particles in electromagnetic field, stored as numpy arrays)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+# Adaptive time steps instead of one global dt.
+# Every particle has its own time and step size, chosen from a tolerance
+# by the embedded error estimate of the Dormand-Prince 5(4) pair: long
+# steps while drifting in weak fields, short ones in fast gyration.
+# Steps of all particles are still taken together, as batched array
+# operations over the (3, n) columns of the particles that need them.
+#     error       - RMS of the 4th/5th order difference of pos and vel,
+#                   scaled by atol + rtol |y|; steps with error > 1 are
+#                   redone shorter, the next step is 0.2 .. 5 times longer
+#     walls       - steps are at most twice the straight flight to the
+#                   wall, and a step ending outside the aperture is
+#                   shortened until it ends within wall_tol of the wall
+#                   (regula falsi with the Illinois fix, bisection when
+#                   it stalls, each trial one step from the start), so
+#                   hits are located to the tolerance of the steps
+#     dense output - state at any time of the last step, by cubic Hermite
+#                   interpolation (pos with vel, vel with acc), so frames
+#                   are rendered at fixed times whatever the steps are
+#
+#     stepper = AdaptiveEnsemble(pos, vel, qm, b_vec=b, aperture=pipe)
+#     stepper.advance_to(t_frame)
+#     pos, vel, acc = stepper.state_at(t_frame)
+
+import numpy as np
+
+from tracker.ensemble import as_column
+from tracker.geometry import interpolate
+from tracker.integrators import cross
+
+# Dormand-Prince 5(4), last stage at the new point (first same as last)
+_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]]
+_E = [71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525,
+      -1 / 40]  # 5th minus 4th order weights
+
+SAFETY = 0.9  # of the optimal step factor
+MIN_FACTOR, MAX_FACTOR = 0.2, 5.0  # limits of step change
+WALL_ITERATIONS = 60  # trials of a step ending on the wall, at most
+
+
+def _cols(a, cols):  # columns of per-particle (3, n) array, or shared one
+    return a if a.shape[1] == 1 else a[:, cols]
+
+
+class AdaptiveEnsemble:
+    def __init__(self, pos, vel, qm, e_vec=(0, 0, 0), b_vec=(0, 0, 0),
+                 field=None, aperture=None, rtol=1e-6, atol=1e-9,
+                 h_max=np.inf, wall_tol=None, t=0.0):
+        self.pos = np.array(as_column(pos))  # state at the end of steps
+        self.vel = np.array(as_column(vel))
+        self.n = self.pos.shape[1]
+        self.qm = np.broadcast_to(np.asarray(qm, float), (self.n,)).copy()
+        self.e = as_column(e_vec)  # uniform fields, (3, 1) or (3, n)
+        self.b = as_column(b_vec)
+        self.field = field  # field source (fields.py) replaces e, b
+        self.aperture = aperture  # walls, see geometry.py
+        self.rtol, self.atol = rtol, atol
+        self.h_max = h_max  # longest step
+        self.wall_tol = wall_tol  # distance of hits from the wall, None -
+        # tolerance of positions, atol + rtol |pos|
+
+        all_cols = np.arange(self.n)
+        self.evaluations = 0  # particle evaluations of the force
+        self.steps = 0  # accepted steps of all particles
+        self.rejected = 0
+        self.acc = self.accel(self.pos, self.vel, all_cols)
+        self.t = np.full(self.n, float(t))  # time of every particle
+        self.h = self.initial_step()  # next step of every particle
+        self.t0 = self.t.copy()  # last step, for dense output
+        self.pos0, self.vel0, self.acc0 = self.pos, self.vel, self.acc
+        self.alive = np.ones(self.n, dtype=bool)  # False after a wall hit
+        self.face = np.full(self.n, -1)  # face of the wall hit
+
+    def set_fields(self, qm, e_vec, b_vec, field=None):  # e.g. sliders
+        self.qm[:] = qm
+        self.e, self.b = as_column(e_vec), as_column(b_vec)
+        self.field = field
+
+    def accel(self, pos, vel, cols):  # q/m (E + v x B) of columns cols
+        if self.field is not None:
+            e, b = self.field.fields(pos)
+        else:
+            e, b = _cols(self.e, cols), _cols(self.b, cols)
+        self.evaluations += len(cols)
+        return self.qm[cols] * (e + cross(vel, b))
+
+    def _scale(self, y0, y1):  # tolerance of every component
+        return self.atol + self.rtol * np.maximum(np.abs(y0), np.abs(y1))
+
+    def initial_step(self):  # 0.01 |y| / |y'| in tolerance units (Hairer)
+        y = np.concatenate([self.pos, self.vel])
+        f = np.concatenate([self.vel, self.acc])
+        sc = self._scale(y, y)
+        d0 = np.sqrt(np.mean((y / sc)**2, axis=0))
+        d1 = np.sqrt(np.mean((f / sc)**2, axis=0))
+        h = np.where((d0 > 1e-5) & (d1 > 1e-5),
+                     0.01 * d0 / np.maximum(d1, 1e-300), 1e-6)
+        return np.minimum(h, self.h_max)
+
+    def _step(self, cols, pos, vel, acc, h):
+        # one Dormand-Prince step of length h (n,) from (pos, vel, acc);
+        # returns new pos, vel, acc and scaled error
+        kx, kv = [vel], [acc]
+        for a in _A[1:]:
+            px = pos + h * sum(c * k for c, k in zip(a, kx) if c)
+            pv = vel + h * sum(c * k for c, k in zip(a, kv) if c)
+            kx.append(pv)
+            kv.append(self.accel(px, pv, cols))
+        ex = h * sum(c * k for c, k in zip(_E, kx) if c)
+        ev = h * sum(c * k for c, k in zip(_E, kv) if c)
+        err = np.concatenate([ex, ev]) / self._scale(
+            np.concatenate([pos, vel]), np.concatenate([px, pv]))
+        return px, pv, kv[-1], np.sqrt(np.mean(err**2, axis=0))
+
+    def advance_to(self, t):  # steps every live particle up to (or past) t
+        while True:
+            cols = np.flatnonzero(self.alive & (self.t < t))
+            if not cols.size:
+                return
+            self._attempt(cols)
+
+    def _attempt(self, cols):  # one trial step of particles cols
+        h = self.h[cols]
+        pos, vel, acc = self.pos[:, cols], self.vel[:, cols], self.acc[:, cols]
+        if self.aperture is not None:  # near walls: shorter steps
+            h = self._approach(pos, vel, h)
+        pos1, vel1, acc1, err = self._step(cols, pos, vel, acc, h)
+        ok = err <= 1
+        with np.errstate(divide="ignore"):
+            factor = np.clip(SAFETY * err**-0.2, MIN_FACTOR, MAX_FACTOR)
+        factor[~ok] = np.minimum(factor[~ok], 1)
+        self.h[cols] = np.minimum(h * factor, self.h_max)
+        self.rejected += int(np.count_nonzero(~ok))
+        self.steps += int(np.count_nonzero(ok))
+
+        hit = np.zeros_like(ok)
+        if self.aperture is not None:
+            hit[ok] = ~self.aperture.inside(pos1[:, ok])
+        keep = ok & ~hit
+        c = cols[keep]
+        self.t0[c] = self.t[c]
+        self.t[c] += h[keep]
+        self._set_last(c, self.pos[:, c], self.vel[:, c], self.acc[:, c])
+        self.pos[:, c], self.vel[:, c], self.acc[:, c] = \
+            pos1[:, keep], vel1[:, keep], acc1[:, keep]
+        if hit.any():
+            self._hit(cols[hit], pos[:, hit], vel[:, hit], acc[:, hit],
+                      h[hit], pos1[:, hit], vel1[:, hit], acc1[:, hit])
+
+    def _approach(self, pos, vel, h):
+        # steps at most twice as long as the straight flight to the wall
+        ahead = pos + vel * h
+        out = ~self.aperture.inside(ahead)
+        if out.any():
+            s, _ = self.aperture.crossing(pos[:, out], ahead[:, out])
+            h = h.copy()
+            h[out] *= np.clip(2 * s, 1e-3, 1)
+        return h
+
+    def _set_last(self, cols, pos, vel, acc):  # start of the last step
+        if self.pos0 is self.pos:  # first step: own arrays
+            self.pos0, self.vel0, self.acc0 = \
+                self.pos.copy(), self.vel.copy(), self.acc.copy()
+        self.pos0[:, cols], self.vel0[:, cols], self.acc0[:, cols] = \
+            pos, vel, acc
+
+    def _hit(self, cols, pos, vel, acc, h, pos1, vel1, acc1):
+        # shortens steps that end outside to end on the wall
+        outside = self.aperture.outside
+        lo, hi = np.zeros_like(h), h.copy()  # inside / outside step length
+        g_lo, g_hi = outside(pos), outside(pos1)
+        inner = [pos.copy(), vel.copy(), acc.copy()]
+        outer = [pos1.copy(), vel1.copy(), acc1.copy()]
+        speed = np.maximum(np.sqrt((vel**2).sum(axis=0)), 1e-300)
+        tol = self.wall_tol
+        if tol is None:
+            tol = self.atol + self.rtol * np.sqrt((pos**2).sum(axis=0))
+        resolution = tol / speed  # in time
+        side = np.zeros(len(cols))  # Illinois: end kept twice in a row
+        width = 2 * h  # bracket before the last trial
+        for _ in range(WALL_ITERATIONS):
+            todo = np.flatnonzero(hi - lo > resolution)
+            if not todo.size:
+                break
+            w = hi[todo] - lo[todo]
+            x = lo[todo] - g_lo[todo] * w / (g_hi[todo] - g_lo[todo])
+            # aimed half a resolution past the root, to the end not moved
+            # last, so both ends close in once the root is found
+            x += np.where(side[todo] == 1, -0.5, 0.5) * resolution[todo]
+            x = np.clip(x, lo[todo] + 0.01 * w, hi[todo] - 0.01 * w)
+            slow = w > 0.5 * width[todo]  # bisection if bracket stalls
+            x[slow] = lo[todo][slow] + 0.5 * w[slow]
+            width[todo] = w
+            p, v, a, _ = self._step(
+                cols[todo], pos[:, todo], vel[:, todo], acc[:, todo], x)
+            g = outside(p)
+            out = g >= 0
+            for state, mask, bound, gb, other_g, sign in (
+                    (outer, out, hi, g_hi, g_lo, 1),
+                    (inner, ~out, lo, g_lo, g_hi, -1)):
+                k = todo[mask]
+                bound[k], gb[k] = x[mask], g[mask]
+                for s, value in zip(state, (p, v, a)):
+                    s[:, k] = value[:, mask]
+                twice = k[side[k] == sign]  # same end moved again
+                other_g[twice] *= 0.5
+                side[k] = sign
+        s, face = self.aperture.crossing(inner[0], outer[0])
+        t_hit = self.t[cols] + interpolate(lo, hi, s)
+        self.t0[cols] = self.t[cols]
+        self._set_last(cols, pos, vel, acc)
+        self.t[cols] = t_hit
+        self.pos[:, cols] = interpolate(inner[0], outer[0], s)
+        self.vel[:, cols] = interpolate(inner[1], outer[1], s)
+        self.acc[:, cols] = inner[2]
+        self.alive[cols] = False
+        self.face[cols] = face
+
+    def state_at(self, t):  # (pos, vel, acc) of all particles at time t
+        h = self.t - self.t0
+        theta = np.clip(np.divide(
+            t - self.t0, h, out=np.ones_like(h), where=h > 0), 0, 1)
+        th2, th3 = theta**2, theta**3
+        h00, h01 = 1 - 3 * th2 + 2 * th3, 3 * th2 - 2 * th3
+        h10, h11 = (theta - 2 * th2 + th3) * h, (th3 - th2) * h
+        pos = h00 * self.pos0 + h10 * self.vel0 + h01 * self.pos \
+            + h11 * self.vel
+        vel = h00 * self.vel0 + h10 * self.acc0 + h01 * self.vel \
+            + h11 * self.acc
+        acc = self.acc0 + theta * (self.acc - self.acc0)
+        return pos, vel, acc
+
+    def lost_particles(self):  # id, t, pos, vel and face of wall hits
+        ids = np.flatnonzero(~self.alive)
+        return dict(id=ids, t=self.t[ids], pos=self.pos[:, ids],
+                    vel=self.vel[:, ids], face=self.face[ids])
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# Closed-form motion of charged particle in uniform, constant E and B.
+# The velocity is split into
+#     drift       v_d = E x B / B^2
+#     parallel    along B, uniformly accelerated by E_par
+#     gyration    w = v_perp - v_d, rotating with Omega = q B / m
+# so the state at any time t is evaluated in O(1), without stepping.
+# Wall hits are found by scanning the orbit (a few points per gyration)
+# and refining the first sign change of the boundary function of an
+# aperture (see geometry.py) by bisection.
+
+import numpy as np
+
+from tracker.integrators import C_LIGHT, cross, dot, half_step, to_array
+
+
+class UniformFieldOrbit:
+    def __init__(self, pos, vel, qm, e_vec, b_vec):
+        self.pos = to_array(pos)  # state at t = 0
+        self.vel = to_array(vel)
+        self.qm = qm  # charge to mass ratio
+        e = to_array(e_vec)
+        b = to_array(b_vec)
+
+        b_mag = np.sqrt(dot(b, b))
+        if b_mag == 0 or qm == 0:  # no rotation: uniform acceleration
+            self.omega = 0.0
+            self.b_hat = np.zeros(3)
+            self.drift = self.vel.copy()
+            self.accel = qm * e
+            self.w0 = np.zeros(3)
+            self.w0xb = np.zeros(3)
+            return
+
+        self.b_hat = b / b_mag
+        self.omega = qm * b_mag  # signed gyrofrequency
+        e_par = dot(e, self.b_hat) * self.b_hat
+        v_par = dot(self.vel, self.b_hat) * self.b_hat
+
+        self.drift = cross(e, b) / b_mag**2 + v_par  # v_d + v_par
+        self.accel = qm * e_par  # acceleration along B
+        self.w0 = self.vel - self.drift  # gyration velocity at t = 0
+        self.w0xb = cross(self.w0, self.b_hat)
+
+    @property
+    def period(self):  # gyration period, inf without magnetic field
+        if self.omega == 0:
+            return np.inf
+        return 2 * np.pi / abs(self.omega)
+
+    def state(self, t):  # (pos, vel) at time t, t may be an array
+        t = np.asarray(t, dtype=np.float64)
+        tt = t[np.newaxis]  # broadcast against components
+
+        drift = self.drift[:, np.newaxis] if t.ndim else self.drift
+        accel = self.accel[:, np.newaxis] if t.ndim else self.accel
+        pos = (self.pos[:, np.newaxis] if t.ndim else self.pos) \
+            + drift * tt + accel * tt**2 / 2
+        vel = drift + accel * tt
+
+        if self.omega != 0:
+            w0 = self.w0[:, np.newaxis] if t.ndim else self.w0
+            w0xb = self.w0xb[:, np.newaxis] if t.ndim else self.w0xb
+            phase = self.omega * tt
+            cos_, sin_ = np.cos(phase), np.sin(phase)
+            pos = pos + (w0 * sin_ + w0xb * (1 - cos_)) / self.omega
+            vel = vel + w0 * cos_ + w0xb * sin_
+
+        if t.ndim == 0:
+            return pos.reshape(3), vel.reshape(3)
+        return pos, vel
+
+    def exit_time(self, aperture, t_max, tol=1e-12, points=32):
+        # first time when particle leaves aperture, None if it doesn't
+        # happen before t_max; aperture may also be a boundary function
+        # outside(pos) of (3, k) positions, >= 0 outside
+        outside = getattr(aperture, "outside", aperture)
+        step = min(self.period / points, t_max / 1024)
+        t0 = 0.0
+        while t0 < t_max:
+            t = np.minimum(t0 + step * np.arange(1, 1025), t_max)
+            pos, _ = self.state(t)
+            hit = np.flatnonzero(outside(pos) >= 0)
+            if hit.size:
+                hi = t[hit[0]]
+                lo = t[hit[0] - 1] if hit[0] else t0
+                return self._bisect(outside, lo, hi, tol)
+            t0 = t[-1]
+        return None
+
+    def _bisect(self, outside, lo, hi, tol):  # outside(lo) < 0 <= (hi)
+        while hi - lo > tol * max(1.0, hi):
+            mid = 0.5 * (lo + hi)
+            pos, _ = self.state(mid)
+            if outside(pos[:, np.newaxis])[0] >= 0:
+                hi = mid
+            else:
+                lo = mid
+        return hi
+
+    def exit_state(self, aperture, t_max, **kwargs):  # (t, pos, vel) / None
+        t = self.exit_time(aperture, t_max, **kwargs)
+        if t is None:
+            return None
+        return (t,) + self.state(t)
+
+
+def reference_error(integrator, pos, vel, qm, e_vec, b_vec, dt, n_steps,
+                    c=None):
+    # largest distance between stepped and exact orbit over n_steps,
+    # checks correctness (and order) of any integrator from integrators.py
+    orbit = UniformFieldOrbit(pos, vel, qm, e_vec, b_vec)
+    e, b = to_array(e_vec), to_array(b_vec)
+    c = C_LIGHT if c is None else c
+    pos = orbit.pos
+    vel = half_step(integrator, orbit.vel, qm, e, b, -dt, c)  # leapfrog
+
+    exact, _ = orbit.state(dt * np.arange(1, n_steps + 1))
+    error = 0.0
+    for i in range(n_steps):
+        pos, vel, _ = integrator(pos, vel, qm, e, b, dt, c)
+        error = max(error, np.sqrt(dot(pos - exact[:, i], pos - exact[:, i])))
+    return error
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+# Beams of any size as sources of chunks instead of one launch position.
+# A BeamSource draws initial states of the coordinates
+#     x, y, z, yp, zp, vx     (as beamstats.VARIABLES: y' = vy / vx, ...)
+# from a Gaussian or waterbag distribution with given mean and covariance
+# (sigmas, or Twiss alpha, beta, emittance of the y and z planes), lazily:
+# chunk k is drawn from its own generator seeded by (seed, k), so it is
+# the same whatever was drawn before, and any chunk can be redone alone.
+# track() pushes the chunks one by one as ensembles (the physics of
+# Particle.move, ensemble.py), or with integrator "adaptive" as
+# AdaptiveEnsembles to t_max (adaptive.py, dt unused), and appends the
+# end states of survivors
+# (transmitted through the exit, or still inside at t_max) to a file
+#     magic  b"PTABEAM1"
+#     uint32 length of header, header as JSON (source and settings),
+#            padded with spaces to a multiple of 64 bytes
+#     records of RECORD dtype: id, t, pos, vel, status
+# so memory is bounded by the chunk size for 10^9 particles, and the
+# output is read memory-mapped (read_end_states), like replay.py.
+# With a Checkpoint (checkpoint.py) the chunks done and records written
+# are stored, and a restarted run truncates the file to the last snapshot
+# and goes on with the next chunk.
+#
+#     source = twiss(10**9, y=(0, 5, 1e-3), z=(0, 5, 1e-3), sigma_vx=0.1)
+#     totals = track(source, "beam.bin", dt=0.01, t_max=30, b_vec=(-1, 0, 0))
+#     params, ends = read_end_states("beam.bin")
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from tracker.adaptive import AdaptiveEnsemble
+from tracker.ensemble import Ensemble
+from tracker.geometry import Cylinder
+from tracker.integrators import ADAPTIVE, to_array
+from tracker.scan import SETTINGS, TRANSMITTED, TRAPPED
+
+MAGIC = b"PTABEAM1"
+RECORD = np.dtype([
+    ("id", "<i8"), ("t", "<f8"), ("pos", "<f4", 3), ("vel", "<f4", 3),
+    ("status", "i1")])
+COORDS = ("x", "y", "z", "yp", "zp", "vx")
+KINDS = ("gaussian", "waterbag")
+
+
+def twiss_cov(alpha, beta, emittance):  # (2, 2) covariance of u, u'
+    gamma = (1 + alpha**2) / beta
+    return emittance * np.array([[beta, -alpha], [-alpha, gamma]])
+
+
+class BeamSource:
+    def __init__(self, n, mean, cov, kind="gaussian", chunk=2**18, seed=0):
+        if kind not in KINDS:
+            raise ValueError(f"unknown distribution {kind!r}")
+        self.n = int(n)  # particles in the beam
+        self.mean = np.asarray(mean, dtype=np.float64)  # (6,) as COORDS
+        self.cov = np.asarray(cov, dtype=np.float64)  # (6, 6)
+        self.kind = kind
+        self.chunk_size = int(chunk)
+        self.seed = seed
+        # covariance = scale scale^T, also for zero sigmas (no Cholesky)
+        w, v = np.linalg.eigh(self.cov)
+        self._scale = v * np.sqrt(np.clip(w, 0, None))
+
+    def __len__(self):  # number of chunks
+        return -(-self.n // self.chunk_size)
+
+    def params(self):  # description, stored with end states
+        return dict(n=self.n, mean=self.mean.tolist(), cov=self.cov.tolist(),
+                    kind=self.kind, chunk=self.chunk_size, seed=self.seed)
+
+    def chunk(self, k):  # (ids, pos, vel) of chunk k, same for same seed
+        start = k * self.chunk_size
+        m = min(self.chunk_size, self.n - start)
+        rng = np.random.default_rng([self.seed, k])
+        w = rng.standard_normal((6, m))  # unit covariance
+        if self.kind == "waterbag":  # uniform in 6-ball of radius sqrt(8)
+            radius = np.sqrt(8) * rng.random(m)**(1 / 6)
+            w *= radius / np.linalg.norm(w, axis=0)
+        c = self.mean[:, np.newaxis] + self._scale @ w
+        vx = c[5]
+        return np.arange(start, start + m), c[:3], np.array(
+            [vx, c[3] * vx, c[4] * vx])
+
+    def chunks(self, start=0):  # chunks from `start` on, drawn lazily
+        for k in range(start, len(self)):
+            yield self.chunk(k)
+
+
+def _mean(center, v0):
+    return [*center, 0.0, 0.0, v0]
+
+
+def gaussian(n, sigma, center=SETTINGS["start"], v0=SETTINGS["v_mag"],
+             **kwargs):  # sigma - of x, y, z, yp, zp, vx
+    cov = np.diag(np.square(np.asarray(sigma, dtype=np.float64)))
+    return BeamSource(n, _mean(center, v0), cov, "gaussian", **kwargs)
+
+
+def waterbag(n, sigma, center=SETTINGS["start"], v0=SETTINGS["v_mag"],
+             **kwargs):  # uniform ellipsoid with RMS sizes sigma
+    cov = np.diag(np.square(np.asarray(sigma, dtype=np.float64)))
+    return BeamSource(n, _mean(center, v0), cov, "waterbag", **kwargs)
+
+
+def twiss(n, y, z, sigma_x=0.0, sigma_vx=0.0, center=SETTINGS["start"],
+          v0=SETTINGS["v_mag"], kind="gaussian", **kwargs):
+    # y, z - (alpha, beta, emittance) of the transverse planes
+    cov = np.zeros((6, 6))
+    cov[0, 0] = sigma_x**2
+    cov[5, 5] = sigma_vx**2
+    cov[np.ix_([1, 3], [1, 3])] = twiss_cov(*y)
+    cov[np.ix_([2, 4], [2, 4])] = twiss_cov(*z)
+    return BeamSource(n, _mean(center, v0), cov, kind, **kwargs)
+
+
+class BeamWriter:
+    def __init__(self, path, params, records=None):
+        # records - continue a file of the same params after its first
+        # `records` records (later ones are dropped), None - new file
+        header = json.dumps(params).encode()
+        size = len(MAGIC) + 4 + len(header)
+        header += b" " * (-size % 64)
+        if records is None:
+            self.records = 0  # records written
+            self.file = open(path, "wb")
+            self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        else:
+            self.records = records
+            self.file = open(path, "r+b")
+            offset = len(MAGIC) + 4 + len(header)
+            self.file.truncate(offset + records * RECORD.itemsize)
+            self.file.seek(0, os.SEEK_END)
+
+    def write(self, ids, t, pos, vel, status):  # appends records
+        out = np.zeros(len(ids), dtype=RECORD)
+        out["id"] = ids
+        out["t"] = t
+        out["pos"] = pos.T
+        out["vel"] = vel.T
+        out["status"] = status
+        out.tofile(self.file)
+        self.file.flush()
+        self.records += len(out)
+
+    def sync(self):  # records written so far on disk, before snapshots
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_end_states(path):  # (header, memory-mapped records) of a file
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a file of beam end states")
+        (length,) = struct.unpack("<I", f.read(4))
+        params = json.loads(f.read(length))
+    offset = len(MAGIC) + 4 + length
+    if os.path.getsize(path) > offset:
+        return params, np.memmap(path, dtype=RECORD, mode="r", offset=offset)
+    return params, np.zeros(0, dtype=RECORD)
+
+
+def end_states(ens, ids, exits=(1,)):
+    # (ids, t, pos, vel, status) of survivors of a tracked chunk, by id:
+    # transmitted through faces `exits`, or still inside
+    return _end_states(ens.lost_particles(), ids, exits, ens.ids,
+                       np.full(ens.n, ens.t), ens.pos, ens.vel)
+
+
+def adaptive_end_states(stepper, ids, t_end, exits=(1,)):
+    # the same for an AdaptiveEnsemble advanced to t_end, particles still
+    # inside at t_end (also those of a last step hitting the wall later)
+    # by its dense output
+    late = stepper.t > t_end
+    inside = np.flatnonzero(stepper.alive | late)
+    lost = stepper.lost_particles()
+    lost = {key: value[..., lost["t"] <= t_end]
+            for key, value in lost.items()}
+    pos, vel, _ = stepper.state_at(t_end)
+    return _end_states(lost, ids, exits, inside,
+                       np.full(inside.size, t_end), pos[:, inside],
+                       vel[:, inside])
+
+
+def _end_states(lost, ids, exits, inside, t_inside, pos_inside,
+                vel_inside):
+    out = np.isin(lost["face"], exits)
+    pid = np.concatenate([lost["id"][out], inside])
+    order = np.argsort(pid)
+    t = np.concatenate([lost["t"][out], t_inside])
+    pos = np.concatenate([lost["pos"][:, out], pos_inside], axis=1)
+    vel = np.concatenate([lost["vel"][:, out], vel_inside], axis=1)
+    status = np.concatenate([
+        np.full(out.sum(), TRANSMITTED, dtype=np.int8),
+        np.full(inside.size, TRAPPED, dtype=np.int8)])
+    return (ids[pid[order]], t[order], pos[:, order], vel[:, order],
+            status[order])
+
+
+def track(source, path=None, dt=0.001, t_max=100.0, e_vec=(0, 0, 0),
+          b_vec=(0, 0, 0), q=0.5, m=1.0, integrator="euler", aperture=None,
+          field=None, exits=(1,), checkpoint=None, rtol=1e-6):
+    # tracks the beam chunk by chunk, end states of survivors appended
+    # to path; returns counts of particles, transmitted, inside and lost;
+    # checkpoint (checkpoint.py) counts chunks, resumes from its snapshot;
+    # rtol - tolerance of adaptive steps (also atol)
+    if aperture is None:  # pipe of Lec01_movement.py
+        aperture = Cylinder(SETTINGS["length"], SETTINGS["radius"])
+    n_steps = int(round(t_max / dt))
+    totals = dict(particles=0, transmitted=0, inside=0, lost=0)
+    start, records = 0, None
+    snapshot = checkpoint.load() if checkpoint is not None else None
+    if snapshot is not None:
+        _, meta = snapshot
+        start, records, totals = meta["chunk"], meta["records"], meta["totals"]
+    writer = None
+    if path is not None:
+        writer = BeamWriter(path, dict(
+            source=source.params(), dt=dt, t_max=t_max,
+            e_vec=to_array(e_vec).tolist(), b_vec=to_array(b_vec).tolist(),
+            q=q, m=m, integrator=integrator), records)
+    try:
+        for k, (ids, pos, vel) in enumerate(source.chunks(start), start):
+            if integrator == ADAPTIVE:
+                stepper = AdaptiveEnsemble(
+                    pos, vel, q / m, e_vec, b_vec, field, aperture,
+                    rtol=rtol, atol=rtol)
+                stepper.advance_to(t_max)
+                ends = adaptive_end_states(stepper, ids, t_max, exits)
+                inside = int(np.count_nonzero(ends[4] == TRAPPED))
+            else:
+                ens = Ensemble.from_arrays(pos, vel, q, m)
+                ens.integrator = integrator
+                ens.run(n_steps, dt, e_vec, b_vec, aperture, field)
+                ends = end_states(ens, ids, exits)
+                inside = ens.n
+            if writer is not None:
+                writer.write(*ends)
+            transmitted = int(np.count_nonzero(ends[4] == TRANSMITTED))
+            totals["particles"] += len(ids)
+            totals["transmitted"] += transmitted
+            totals["inside"] += inside
+            totals["lost"] += len(ids) - transmitted - inside
+            if checkpoint is not None and checkpoint.due(k + 1):
+                if writer is not None:
+                    writer.sync()
+                checkpoint.save({}, dict(
+                    chunk=k + 1, totals=totals,
+                    records=writer.records if writer is not None else 0))
+    finally:
+        if writer is not None:
+            writer.close()
+    return totals
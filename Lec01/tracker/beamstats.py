@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# Beam statistics accumulated during the push, without trajectories.
+# Every sample (station or time) keeps only the count, the means and the
+# co-moment matrix of the variables
+#     t, x, y, z   - time and position
+#     yp, zp       - divergences y' = vy / vx, z' = vz / vx (beam along x)
+#     vx           - longitudinal velocity
+# merged batch by batch with the pairwise form of Welford's update
+# (Chan et al.), one pass and numerically stable, so memory is
+# O(samples) whatever the number of particles and steps.
+#
+# StationMonitor  - particles crossing planes x = s (forward crossings,
+#                   interpolated to the plane), e.g. along the pipe
+# TimeMonitor     - all live particles every `interval` of time
+# Monitors are called by Ensemble.push after every step:
+#     monitor = StationMonitor(np.linspace(0, 200, 41))
+#     ens.monitors.append(monitor)
+#     ens.run(...)
+#     monitor.save("stations.npz")   # table(): centroid, RMS size,
+#                                    # divergence, emittance per sample
+# state() / load_state() give the sums as arrays for checkpoint.py.
+
+import numpy as np
+
+VARIABLES = ("t", "x", "y", "z", "yp", "zp", "vx")
+_INDEX = {name: i for i, name in enumerate(VARIABLES)}
+
+
+class Moments:
+    def __init__(self, k=len(VARIABLES)):
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros((k, k))  # sum of products of deviations
+
+    def add(self, batch):  # merges (k, m) samples
+        m = batch.shape[1]
+        if not m:
+            return
+        mean = batch.mean(axis=1)
+        d = batch - mean[:, np.newaxis]
+        n = self.n + m
+        delta = mean - self.mean
+        self.m2 += d @ d.T + np.outer(delta, delta) * (self.n * m / n)
+        self.mean += delta * (m / n)
+        self.n = n
+
+    @property
+    def cov(self):  # covariance matrix (population)
+        return self.m2 / self.n if self.n else np.full_like(self.m2, np.nan)
+
+
+def stack(samples):  # arrays of a list of Moments
+    k = len(VARIABLES)
+    return dict(
+        n=np.array([m.n for m in samples], dtype=np.int64),
+        mean=np.array([m.mean for m in samples]).reshape(-1, k),
+        m2=np.array([m.m2 for m in samples]).reshape(-1, k, k))
+
+
+def unstack(arrays):  # list of Moments from stack()
+    samples = []
+    for n, mean, m2 in zip(arrays["n"], arrays["mean"], arrays["m2"]):
+        moments = Moments()
+        moments.n, moments.mean[:], moments.m2[:] = int(n), mean, m2
+        samples.append(moments)
+    return samples
+
+
+def variables(t, pos, vel):  # (k, n) samples, particles with vx != 0
+    ok = vel[0] != 0
+    pos, vel = pos[:, ok], vel[:, ok]
+    t = np.broadcast_to(t, pos.shape[1:])
+    return np.array([
+        t, pos[0], pos[1], pos[2], vel[1] / vel[0], vel[2] / vel[0], vel[0]])
+
+
+def emittance(cov, u, up):  # RMS emittance sqrt(<u^2><u'^2> - <uu'>^2)
+    i, j = _INDEX[u], _INDEX[up]
+    det = cov[i, i] * cov[j, j] - cov[i, j]**2
+    return np.sqrt(max(det, 0.0))
+
+
+def table(key, values, samples):  # columns of reduced table
+    columns = {key: np.asarray(values, dtype=np.float64),
+               "n": np.array([m.n for m in samples])}
+    covs = [m.cov for m in samples]
+    for name, i in _INDEX.items():
+        columns[f"mean_{name}"] = np.array([m.mean[i] for m in samples])
+        columns[f"rms_{name}"] = np.array([np.sqrt(c[i, i]) for c in covs])
+    columns["emittance_y"] = np.array([emittance(c, "y", "yp") for c in covs])
+    columns["emittance_z"] = np.array([emittance(c, "z", "zp") for c in covs])
+    return columns
+
+
+class StationMonitor:
+    def __init__(self, stations):
+        self.stations = np.sort(np.asarray(stations, dtype=np.float64))
+        self.moments = [Moments() for _ in self.stations]
+
+    def __call__(self, ens, dt):  # samples particles that crossed planes
+        p1, vel, flight = ens.pos, ens.vel, ens.flight()
+        x1 = p1[0]
+        x0 = x1 - flight[0] * dt  # all integrators do x += v_new dt
+        first = np.searchsorted(self.stations, x0, side="right")
+        last = np.searchsorted(self.stations, x1, side="right")
+        moving = np.flatnonzero(last > first)  # forward, crossed planes
+        if not moving.size:
+            return
+        first, last = first[moving], last[moving]
+        for j in range(int((last - first).max())):  # planes per step
+            cols = moving[first + j < last]
+            k = (first + j)[first + j < last]
+            s = self.stations[k]
+            frac = (s - x0[cols]) / (x1[cols] - x0[cols])  # along step
+            pos = p1[:, cols] - flight[:, cols] * dt * (1 - frac)
+            batch = variables(ens.t - (1 - frac) * dt, pos, vel[:, cols])
+            order = np.argsort(k, kind="stable")
+            k, batch = k[order], batch[:, order]
+            bounds = np.flatnonzero(np.diff(k)) + 1
+            for ks, part in zip(np.split(k, bounds),
+                                np.split(batch, bounds, axis=1)):
+                self.moments[ks[0]].add(part)
+
+    def table(self):
+        return table("s", self.stations, self.moments)
+
+    def state(self):  # sums so far, as arrays
+        return stack(self.moments)
+
+    def load_state(self, arrays):
+        self.moments = unstack(arrays)
+
+    def save(self, path):
+        np.savez(path, **self.table())
+
+
+class TimeMonitor:
+    def __init__(self, interval, start=0.0):
+        self.interval = interval
+        self.next = start  # time of the next sample
+        self.times = []
+        self.moments = []
+
+    def __call__(self, ens, dt):  # samples all particles every interval
+        if ens.t + 1e-9 * dt < self.next:
+            return
+        moments = Moments()
+        moments.add(variables(ens.t, ens.pos, ens.vel))
+        self.times.append(ens.t)
+        self.moments.append(moments)
+        while self.next <= ens.t + 1e-9 * dt:
+            self.next += self.interval
+
+    def table(self):
+        return table("t", self.times, self.moments)
+
+    def state(self):  # samples so far, as arrays
+        return dict(stack(self.moments), times=np.array(self.times, float),
+                    next=np.array(self.next))
+
+    def load_state(self, arrays):
+        self.moments = unstack(arrays)
+        self.times = [float(t) for t in arrays["times"]]
+        self.next = float(arrays["next"])
+
+    def save(self, path):
+        np.savez(path, **self.table())
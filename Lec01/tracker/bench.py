@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+# Benchmarks of the particle push, run headless (see headless.py):
+#     single/<script>/<integrator>/move    - steps/s of move(), physics only
+#     single/<script>/render               - renders/s of scene updates
+#     ensemble/<integrator>/n=<n>          - particle-steps/s of Ensemble
+#     launch/<script>/dt=<dt>              - seconds per launch() with the
+#                                            default slider settings
+#     sharded/<integrator>/workers=<w>     - particle-steps/s of
+#                                            ShardedEnsemble (scaling),
+#                                            w = 1, 2, 4 on every machine
+#     reference                            - runs/s of a fixed kernel of
+#                                            plain Python and numpy
+# Every result also has `relative`, its value in units of the reference
+# kernel timed in the same run, and baselines are compared by that, so
+# one baseline fits machines of other speeds. Scaling does not carry
+# over: sharded results note the cores their workers got, and are only
+# compared with a baseline measured on as many. Keys of the baseline not
+# measured, and results without a baseline, are listed, not compared.
+# Results are printed as JSON and compared with stored baselines:
+#     cd Lec01
+#     python -m tracker.bench                    # fails on regressions
+#     python -m tracker.bench --save-baseline    # after a speed-up, or
+#                                                # on another machine
+#     python -m tracker.bench --quick --output results.json
+
+import argparse
+import importlib
+import json
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from tracker.ensemble import Ensemble
+from tracker.sharded import ShardedEnsemble
+
+BASELINE = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+SCRIPTS = {"Lec01": "proton", "Lec01_movement": "particle"}
+
+
+def best_time(func, repeat=3):  # best wall time of func() over repeats
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def reference_kernel():  # fixed work outside the tracker, never changes
+    x = np.arange(3 * 10**4, dtype=np.float64).reshape(3, -1)
+    v = np.zeros_like(x)
+    for _ in range(200):  # numpy arithmetic of a push
+        v += 1e-3 * x
+        v *= 0.5
+    s = 0.0
+    for i in range(100000):  # interpreter, as a single-particle push
+        s += i * 0.5
+    return s
+
+
+def load_script(name):  # imports lecture script with headless backend
+    os.environ["PHYSTECH_HEADLESS"] = "1"
+    return importlib.import_module(name)
+
+
+def bench_single(results, n_steps, repeat):
+    for name, attr in SCRIPTS.items():
+        script = load_script(name)
+        particle = getattr(script, attr)
+        reset = getattr(particle, "reset", None) or particle.reset_proton
+
+        for integrator in ("euler", "boris"):
+            particle.integrator = integrator
+
+            def run():
+                reset()
+                for _ in range(n_steps):
+                    particle.move()
+            results[f"single/{name}/{integrator}/move"] = dict(
+                value=n_steps / best_time(run, repeat),
+                unit="steps/s", better="higher")
+        particle.integrator = "euler"
+
+        def render():
+            for _ in range(n_steps):
+                particle.render()
+        results[f"single/{name}/render"] = dict(
+            value=n_steps / best_time(render, repeat),
+            unit="renders/s", better="higher")
+
+
+def bench_ensemble(results, counts, total, repeat, dt=1e-3):
+    rng = np.random.default_rng(0)
+    for n in counts:
+        for integrator in ("euler", "boris"):
+            ens = Ensemble(n, integrator=integrator)
+            ens.vel[:] = rng.normal(0, 10, (3, n))
+            n_steps = max(5, total // n)
+            seconds = best_time(
+                lambda: ens.run(n_steps, dt, (5, 0, 0), (-5, 0, 0)), repeat)
+            results[f"ensemble/{integrator}/n={n}"] = dict(
+                value=n * n_steps / seconds,
+                unit="particle-steps/s", better="higher")
+
+
+def bench_launch(results, dts, repeat):
+    for name in SCRIPTS:
+        script = load_script(name)
+        saved = script.dt, script.substeps
+        for dt in dts:
+            script.dt, script.substeps = dt, None
+
+            def launch():
+                if hasattr(script, "to_start"):
+                    script.to_start()
+                script.launch()
+            results[f"launch/{name}/dt={dt:g}"] = dict(
+                value=best_time(launch, repeat),
+                unit="s/launch", better="lower")
+        script.dt, script.substeps = saved
+
+
+def bench_sharded(results, n, n_steps, repeat, dt=1e-3):
+    rng = np.random.default_rng(0)
+    vel = rng.normal(0, 10, (3, n))
+    for integrator in ("euler", "boris"):
+        for w in (1, 2, 4):
+            with ShardedEnsemble.from_arrays(
+                    np.zeros((3, n)), vel, integrator=integrator,
+                    workers=w) as beam:
+                seconds = best_time(lambda: beam.run(
+                    n_steps, dt, (5, 0, 0), (-5, 0, 0)), repeat)
+            results[f"sharded/{integrator}/workers={w}"] = dict(
+                value=n * n_steps / seconds,
+                unit="particle-steps/s", better="higher",
+                cores=min(w, os.cpu_count()))
+
+
+def run(quick=False, repeat=3):  # all benchmarks, dict of results
+    # quick mode only skips the long launches; everything else runs in the
+    # same order as in the full run (numpy temporaries of the pushes are
+    # sensitive to what was allocated before), so one baseline fits both
+    results = {}
+    bench_single(results, 20000, repeat)
+    bench_ensemble(results, [10**3, 10**4, 10**5, 10**6], 10**7, repeat)
+    bench_launch(results, [1e-3] if quick else [1e-3, 1e-4], repeat)
+    bench_sharded(results, 10**6, 10, repeat)
+    reference = 1 / best_time(reference_kernel, max(repeat, 5))
+    for result in results.values():  # in units of the reference kernel
+        if result["better"] == "higher":
+            result["relative"] = result["value"] / reference
+        else:
+            result["relative"] = result["value"] * reference
+    results["reference"] = dict(
+        value=reference, unit="runs/s", better="higher")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # (slow, skipped): slow benchmarks as (key, base, value) of relative
+    # values, and (key, reason) of the ones not compared
+    slow, skipped = [], []
+    for key in sorted(set(results) - set(baseline) - {"reference"}):
+        skipped.append((key, "no baseline"))
+    for key, base in sorted(baseline.items()):
+        if key == "reference":  # speed of the machine, not of the code
+            continue
+        if key not in results:
+            skipped.append((key, "not measured"))
+            continue
+        result = results[key]
+        if "relative" not in base:
+            skipped.append((key, "baseline without relative value"))
+            continue
+        if result.get("cores") != base.get("cores"):
+            skipped.append((key, f"{result.get('cores')} cores, baseline "
+                                 f"on {base.get('cores')}"))
+            continue
+        value = result["relative"]
+        if base["better"] == "higher":
+            ratio = value / base["relative"]
+        else:
+            ratio = base["relative"] / value
+        if ratio < 1 - tolerance:
+            slow.append((key, base["relative"], value))
+    return slow, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of the particle push (headless)")
+    parser.add_argument("--quick", action="store_true",
+                        help="skip launches with small time step")
+    parser.add_argument("--output", help="write results to JSON file")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed slow-down, 0.3 = 30%%")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(text + "\n")
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    slow, skipped = compare(results, baseline, args.tolerance)
+    for key, reason in skipped:
+        print(f"SKIPPED {key}: {reason}", file=sys.stderr)
+    for key, base, value in slow:
+        print(f"REGRESSION {key}: {value:.4g} vs {base:.4g} "
+              f"(relative to the reference kernel)", file=sys.stderr)
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
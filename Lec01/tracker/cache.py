@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Persistent, content-addressed cache of sampled geometry (point arrays).
+# An entry is a .npz file named by the sha256 of its key, the key being
+# anything with a stable repr (function sources, ranges, style, ...).
+# Reading an entry touches it, and after every write the least recently
+# used entries are removed until the cache fits into max_bytes.
+# Used by Lec01_manim.py so re-rendering skips unchanged curves and labels.
+
+import hashlib
+import inspect
+import os
+import tempfile
+
+import numpy as np
+
+
+def source_key(*funcs):  # part of key that changes when code changes
+    parts = []
+    for func in funcs:
+        try:
+            parts.append(inspect.getsource(func))
+        except (OSError, TypeError):  # lambdas from REPL, builtins, ...
+            code = getattr(func, "__code__", None)
+            parts.append(repr((code.co_code, code.co_consts))
+                         if code is not None else repr(func))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+class GeometryCache:
+    def __init__(self, directory, max_bytes=64 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes  # size limit of all entries
+        self.hits = self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, *parts):  # file name of entry for key parts
+        return hashlib.sha256(repr(parts).encode()).hexdigest() + ".npz"
+
+    def load(self, name):  # dict of arrays, None if not cached
+        path = os.path.join(self.directory, name)
+        try:
+            with np.load(path) as data:
+                arrays = {k: data[k] for k in data.files}
+        except (OSError, ValueError):  # missing or broken entry
+            return None
+        os.utime(path)  # most recently used
+        return arrays
+
+    def save(self, name, arrays):  # atomic write, then eviction
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, os.path.join(self.directory, name))
+        self.evict()
+
+    def evict(self):  # removes least recently used entries over the limit
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def get(self, parts, compute):  # cached arrays, compute() on a miss
+        name = self.key(*parts)
+        arrays = self.load(name)
+        if arrays is None:
+            self.misses += 1
+            arrays = compute()
+            self.save(name, arrays)
+        else:
+            self.hits += 1
+        return arrays
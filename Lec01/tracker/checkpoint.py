@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+# Snapshots of long runs, to continue after an interruption instead of
+# starting again from reset().
+# A snapshot is one .npz file: arrays (ensemble columns, lost-particle
+# records, monitor sums, ...) plus a JSON header in the array "meta"
+# (time, steps, run settings, states of numpy random generators, ...).
+# It is written to a temporary file in the same directory, synced and
+# renamed over the previous one (os.replace), so the latest snapshot is
+# complete whenever the job is killed. Everything a step depends on is
+# stored exactly (float64 time included), so a resumed run gives the
+# same bits as an uninterrupted one.
+# A field source with state() and load_state() (SpaceCharge) is stored
+# too, and bound to the restored ensemble.
+# Runners take a Checkpoint: run() here, beams.track(), Lattice.track();
+# with resume=True (default) they continue from the snapshot if there
+# is one, so a preempted job is simply started again.
+#
+#     checkpoint = Checkpoint("run.ckpt.npz", seconds=600)
+#     ens = run(ens, 10**7, dt, e, b, aperture, checkpoint=checkpoint)
+#     ens = resume("run.ckpt.npz", aperture)   # same, settings from file
+
+import json
+import os
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from tracker.ensemble import Ensemble, as_column
+from tracker.integrators import to_array
+
+VERSION = 1
+
+
+def write(path, arrays, meta):  # atomic write of arrays and JSON header
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            header = json.dumps(dict(meta, version=VERSION)).encode()
+            np.savez(f, meta=np.frombuffer(header, dtype=np.uint8), **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def read(path):  # (arrays, meta) of a snapshot
+    with np.load(path) as data:
+        arrays = {k: data[k] for k in data.files if k != "meta"}
+        meta = json.loads(data["meta"].tobytes())
+    if meta.pop("version") != VERSION:
+        raise ValueError(f"{path} is a snapshot of another version")
+    return arrays, meta
+
+
+def ensemble_state(ens, monitors=(), field=None):
+    # (arrays, meta) of an ensemble, its monitors and field source
+    lost = ens.lost_particles()
+    arrays = dict(
+        pos=ens.pos, vel=ens.vel, acc=ens.acc, q=ens.q, m=ens.m,
+        ids=ens.ids, slot=ens.slot,
+        **{f"lost_{k}": v for k, v in lost.items()})
+    if ens.half is not None:  # leapfrog velocities, see ensemble.py
+        arrays["half"] = ens.half
+    for i, monitor in enumerate(monitors):  # e.g. beamstats.py
+        arrays.update(
+            {f"monitor{i}_{k}": v for k, v in monitor.state().items()})
+    if hasattr(field, "state"):  # e.g. spacecharge.py
+        arrays.update({f"field_{k}": v for k, v in field.state().items()})
+    meta = dict(t=ens.t, steps=ens.steps, integrator=ens.integrator,
+                c=ens.c, half_dt=ens._half_dt)
+    return arrays, meta
+
+
+def restore_ensemble(arrays, meta, monitors=(), field=None):
+    # ensemble of a snapshot, with the states of monitors and field
+    ens = Ensemble(len(arrays["ids"]), integrator=meta["integrator"])
+    for name in ("pos", "vel", "acc", "q", "m", "ids", "slot"):
+        setattr(ens, name, arrays[name])
+    ens.t, ens.steps, ens.c = meta["t"], meta["steps"], meta["c"]
+    ens.half, ens._half_dt = arrays.get("half"), meta.get("half_dt")
+    if len(arrays["lost_id"]):
+        ens._lost = [{k[5:]: v for k, v in arrays.items()
+                      if k.startswith("lost_")}]
+    for i, monitor in enumerate(monitors):
+        prefix = f"monitor{i}_"
+        monitor.load_state({k[len(prefix):]: v for k, v in arrays.items()
+                            if k.startswith(prefix)})
+    ens.monitors = list(monitors)
+    if hasattr(field, "load_state"):
+        field.load_state({k[6:]: v for k, v in arrays.items()
+                          if k.startswith("field_")})
+        field.ensemble = ens  # charges of the restored particles
+    return ens
+
+
+class Checkpoint:
+    def __init__(self, path, every=None, seconds=None, resume=True):
+        self.path = path
+        self.every = every  # snapshot every n steps (turns, chunks)
+        self.seconds = seconds  # or every n seconds of wall time
+        self.resume = resume  # False - start over, ignore old snapshot
+        self.saves = 0
+        self._last = perf_counter()
+
+    def due(self, count):  # True if a snapshot is due after count steps
+        if self.every is not None and count % self.every == 0:
+            return True
+        return self.seconds is not None \
+            and perf_counter() - self._last >= self.seconds
+
+    def save(self, arrays, meta, rngs=None):
+        # rngs - dict of numpy Generators, their states are stored too
+        meta = dict(meta, rngs={name: rng.bit_generator.state
+                                for name, rng in (rngs or {}).items()})
+        write(self.path, arrays, meta)
+        self.saves += 1
+        self._last = perf_counter()
+
+    def load(self, rngs=None):  # (arrays, meta) to resume from, or None
+        if not self.resume or not os.path.exists(self.path):
+            return None
+        arrays, meta = read(self.path)
+        for name, rng in (rngs or {}).items():
+            rng.bit_generator.state = meta["rngs"][name]
+        return arrays, meta
+
+
+def run(ens, n_steps, dt, e_vec, b_vec, aperture=None, field=None,
+        checkpoint=None, rngs=None):
+    # pushes ensemble until it made n_steps in all, with snapshots; the
+    # run continues from the checkpoint's snapshot if it has one
+    settings = dict(n_steps=n_steps, dt=dt, e_vec=to_array(e_vec).tolist(),
+                    b_vec=to_array(b_vec).tolist())
+    monitors = list(ens.monitors)
+    if checkpoint is not None:
+        snapshot = checkpoint.load(rngs)
+        if snapshot is not None:
+            ens = restore_ensemble(*snapshot, monitors, field)
+    e, b = as_column(settings["e_vec"]), as_column(settings["b_vec"])
+    while ens.steps < n_steps and ens.n:
+        ens.push(dt, e, b, aperture, field)
+        if checkpoint is not None and checkpoint.due(ens.steps):
+            arrays, meta = ensemble_state(ens, monitors, field)
+            checkpoint.save(arrays, dict(meta, settings=settings), rngs)
+    if checkpoint is not None:  # finished: a restart only loads it
+        arrays, meta = ensemble_state(ens, monitors, field)
+        checkpoint.save(arrays, dict(meta, settings=settings), rngs)
+    return ens
+
+
+def resume(path, aperture=None, field=None, monitors=(), rngs=None,
+           every=None, seconds=None):
+    # continues the run of a snapshot with its settings; aperture, field
+    # and monitors are not stored, they are given as for the first run
+    arrays, meta = read(path)
+    ens = restore_ensemble(arrays, meta, monitors, field)
+    for name, rng in (rngs or {}).items():
+        rng.bit_generator.state = meta["rngs"][name]
+    s = meta["settings"]
+    checkpoint = Checkpoint(path, every, seconds, resume=False)
+    return run(ens, s["n_steps"], s["dt"], s["e_vec"], s["b_vec"],
+               aperture, field, checkpoint, rngs)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+# Ensemble of charged particles in electromagnetic field.
+# State is kept as struct-of-arrays: every component (x, y, z, vx, ...)
+# is one contiguous row of a (3, n) numpy buffer, so the whole beam is
+# advanced with a few batched array operations per step instead of
+# one python object per particle.
+# Particles that leave an aperture (see geometry.py) are recorded at the
+# exact crossing point and removed, so later steps only touch survivors;
+# particles are therefore addressed by id, column(id) gives their column.
+# With the leapfrog (Boris) integrators the pushed velocities are half a
+# step behind, in `half`; vel is kept at the time of pos for everybody
+# else (monitors, views, end states).
+
+import numpy as np
+
+from tracker.geometry import interpolate
+from tracker.integrators import C_LIGHT, get_integrator, half_step
+
+
+def as_column(vec):  # vpython vector / sequence / array -> (3, 1) array
+    if hasattr(vec, "x"):
+        return np.array([[vec.x], [vec.y], [vec.z]], dtype=np.float64)
+    vec = np.asarray(vec, dtype=np.float64)
+    if vec.ndim == 1:
+        return vec.reshape(3, 1)
+    return vec
+
+
+class Ensemble:
+    def __init__(self, n, q=0.5, m=1.0, integrator="euler"):
+        self.n = n  # number of particles
+        self.integrator = integrator  # see integrators.py
+        self.c = C_LIGHT  # speed of light for relativistic integrator
+        self.t = 0.0  # time of the ensemble
+        self.steps = 0  # number of steps done
+
+        self.pos = np.zeros((3, n))  # positions, rows are x, y, z
+        self.vel = np.zeros((3, n))  # velocities
+        self.acc = np.zeros((3, n))  # acceleration from the last step
+        self.q = np.full(n, q, dtype=np.float64)  # charges
+        self.m = np.full(n, m, dtype=np.float64)  # masses
+
+        self.ids = np.arange(n)  # id of particle in every column
+        self.slot = np.arange(n)  # column of every id, -1 for lost ones
+        self._lost = []  # records of lost particles, see lost_particles()
+        self.monitors = []  # monitor(ensemble, dt) after every push
+
+        self.half = None  # leapfrog: velocities at t - dt/2, see push()
+        self._half_dt = None  # step of half
+
+        self._qm = None  # cached q/m, rebuilt when q or m change
+        self._vxb = np.zeros((3, n))  # scratch buffer for v x B
+
+    @classmethod
+    def from_arrays(cls, pos, vel, q=0.5, m=1.0):  # builds from (3, n)
+        pos = np.asarray(pos, dtype=np.float64)
+        ens = cls(pos.shape[1])
+        ens.pos[:] = pos
+        ens.vel[:] = vel
+        ens.q[:] = q
+        ens.m[:] = m
+        return ens
+
+    def set_member(self, pid, pos, vel, q=None, m=None):  # sets a particle
+        i = self.slot[pid]
+        self.pos[:, i] = as_column(pos)[:, 0]
+        self.vel[:, i] = as_column(vel)[:, 0]
+        if q is not None:
+            self.q[i] = q
+        if m is not None:
+            self.m[i] = m
+        self.changed()
+
+    def changed(self):  # call after editing q, m or vel arrays in place
+        self._qm = None
+        self.half = None  # leapfrog starts again from vel
+
+    @property
+    def qm(self):  # charge to mass ratio of every particle
+        if self._qm is None:
+            self._qm = self.q / self.m
+        return self._qm
+
+    def accelerate(self, e_vec, b_vec):  # a = q/m (E + v x B) for all
+        e = as_column(e_vec)
+        b = as_column(b_vec)
+        v, a, vxb = self.vel, self.acc, self._vxb
+
+        np.multiply(v[1], b[2], out=vxb[0])
+        vxb[0] -= v[2] * b[1]
+        np.multiply(v[2], b[0], out=vxb[1])
+        vxb[1] -= v[0] * b[2]
+        np.multiply(v[0], b[1], out=vxb[2])
+        vxb[2] -= v[1] * b[0]
+
+        np.add(vxb, e, out=a)
+        a *= self.qm
+        return a
+
+    def column(self, pid):  # column of particle with id pid, -1 if lost
+        return self.slot[pid]
+
+    def state(self, pid):  # (pos, vel, acc) of particle, lost ones too
+        i = self.slot[pid]
+        if i >= 0:
+            return self.pos[:, i], self.vel[:, i], self.acc[:, i]
+        lost = self.lost_particles()
+        k = np.flatnonzero(lost["id"] == pid)[0]
+        return lost["pos"][:, k], lost["vel"][:, k], np.zeros(3)
+
+    def push(self, dt, e_vec, b_vec, aperture=None, field=None):
+        # moves all by step; field (see fields.py) replaces e_vec, b_vec
+        if field is not None:
+            e_vec, b_vec = field.fields(self.pos)
+        if self.integrator == "euler":  # in place, without temporaries
+            a = self.accelerate(e_vec, b_vec)
+            self.vel += a * dt  # a = dv/dt
+            self.pos += self.vel * dt  # v = dx/dt
+            self.half = None
+        else:
+            step = get_integrator(self.integrator)
+            e, b = as_column(e_vec), as_column(b_vec)
+            if self.half is None or dt != self._half_dt:  # leapfrog start
+                self.half = half_step(
+                    step, self.vel, self.qm, e, b, -dt, self.c)
+                self._half_dt = dt
+            self.pos[:], self.half, self.acc[:] = step(
+                self.pos, self.half, self.qm, e, b, dt, self.c)
+            self.vel[:] = half_step(step, self.half, self.qm, e, b, dt, self.c)
+        self.t += dt
+        self.steps += 1
+        for monitor in self.monitors:  # e.g. beamstats.py, before losses
+            monitor(self, dt)
+        if aperture is not None:
+            self.cull(aperture, dt)
+
+    def run(self, n_steps, dt, e_vec, b_vec, aperture=None, field=None):
+        # n pushes, field as in push()
+        e = as_column(e_vec)
+        b = as_column(b_vec)
+        for _ in range(n_steps):
+            self.push(dt, e, b, aperture, field)
+            if not self.n:
+                break
+
+    def cull(self, aperture, dt):  # removes particles that left aperture
+        out = ~aperture.inside(self.pos)
+        if not out.any():
+            return 0
+        p1 = self.pos[:, out]
+        p0 = p1 - self.flight()[:, out] * dt
+        s, face = aperture.crossing(p0, p1)
+        self._lost.append(dict(
+            id=self.ids[out], t=self.t - (1 - s) * dt,
+            pos=interpolate(p0, p1, s), vel=self.vel[:, out], face=face))
+        self.compact(~out)
+        return len(s)
+
+    def flight(self):  # velocities of the last step, x += v dt
+        return self.vel if self.half is None else self.half
+
+    def compact(self, keep):  # keeps only columns where keep is True
+        for name in ("pos", "vel", "acc", "_vxb"):
+            setattr(self, name, np.ascontiguousarray(
+                getattr(self, name)[:, keep]))
+        if self.half is not None:
+            self.half = self.half[:, keep]
+        self.slot[self.ids[~keep]] = -1
+        self.q, self.m, self.ids = self.q[keep], self.m[keep], self.ids[keep]
+        self.slot[self.ids] = np.arange(len(self.ids))
+        self.n = len(self.ids)
+        self._qm = None
+
+    def lost_particles(self):  # id, t, pos, vel and face of lost particles
+        if not self._lost:
+            return dict(
+                id=np.zeros(0, dtype=np.int64), t=np.zeros(0),
+                pos=np.zeros((3, 0)), vel=np.zeros((3, 0)),
+                face=np.zeros(0, dtype=np.int64))
+        return {key: np.concatenate([rec[key] for rec in self._lost], axis=-1)
+                for key in self._lost[0]}
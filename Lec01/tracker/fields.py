@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+# Non-uniform fields for whole particle arrays (positions of shape (3, n)).
+# Every field source has
+#     fields(pos)  - (e, b), both of shape (3, n), at the given positions
+# so an ensemble (or a single particle as a (3, 1) column) gets its
+# fields in one vectorized call per step.
+#
+# UniformField  - constant E and B, as the sliders of the scripts
+# Dipole        - transverse B with smooth (tanh) edges along x
+# Quadrupole    - B_y = g z, B_z = g y inside, same edges as Dipole
+# Solenoid      - finite solenoid (on-axis field with radial fringe)
+# Superposition - sum of several sources (a lattice of elements)
+# FieldMap      - E and B sampled on a regular 3D grid, trilinear
+#                 interpolation, zero outside the grid
+# Magnets are along the x axis, as the pipe of Lec01_movement.py; the
+# longitudinal fringe components follow from curl B = 0 to first order.
+#
+# Field map file layout (same scheme as replay.py)
+#     magic  b"PTAFMAP1"
+#     uint32 length of header, header as JSON (origin, spacing, shape),
+#            padded with spaces to a multiple of 64 bytes
+#     float32 array (6, nx, ny, nz): Ex, Ey, Ez, Bx, By, Bz
+# Maps are memory-mapped, so only the grid cells around the particles
+# are read from disk, and sampling a source to a file goes slab by slab:
+# maps larger than RAM are fine both ways. A loaded map pickles as its
+# path (e.g. to the workers of sharded.py), so it is never copied.
+
+import json
+import struct
+
+import numpy as np
+
+from tracker.integrators import to_array
+
+MAGIC = b"PTAFMAP1"
+
+
+def _column(vec):
+    return to_array(vec)[:, np.newaxis]
+
+
+def edge_profile(x, start, length, fringe):
+    # 1 inside [start, start + length], smooth tanh fall-off of width
+    # fringe at both edges (hard edges for fringe = 0); and d/dx of it
+    x = np.asarray(x, dtype=np.float64)
+    if fringe == 0:
+        inside = (x >= start) & (x <= start + length)
+        return inside.astype(np.float64), np.zeros_like(x)
+    t0 = np.tanh((x - start) / fringe)
+    t1 = np.tanh((x - start - length) / fringe)
+    return 0.5 * (t0 - t1), 0.5 * (t1**2 - t0**2) / fringe
+
+
+class UniformField:
+    def __init__(self, e_vec=(0, 0, 0), b_vec=(0, 0, 0)):
+        self.e = _column(e_vec)
+        self.b = _column(b_vec)
+
+    def fields(self, pos):
+        shape = np.shape(pos)
+        return (np.broadcast_to(self.e, shape).copy(),
+                np.broadcast_to(self.b, shape).copy())
+
+
+class Dipole:
+    def __init__(self, b_vec, length, start=0.0, fringe=0.0):
+        self.b = to_array(b_vec)  # field inside, transverse to x
+        self.length = length
+        self.start = start  # x of the entrance edge
+        self.fringe = fringe  # width of the edges
+
+    def fields(self, pos):
+        p, dp = edge_profile(pos[0], self.start, self.length, self.fringe)
+        b = np.zeros_like(pos, dtype=np.float64)
+        b[1] = self.b[1] * p
+        b[2] = self.b[2] * p
+        b[0] = (pos[1] * self.b[1] + pos[2] * self.b[2]) * dp
+        return np.zeros_like(b), b
+
+
+class Quadrupole:
+    def __init__(self, gradient, length, start=0.0, fringe=0.0):
+        self.gradient = gradient  # dB_y/dz = dB_z/dy, focusing in y or z
+        self.length = length
+        self.start = start
+        self.fringe = fringe
+
+    def fields(self, pos):
+        p, dp = edge_profile(pos[0], self.start, self.length, self.fringe)
+        g = self.gradient
+        b = np.zeros_like(pos, dtype=np.float64)
+        b[1] = g * pos[2] * p
+        b[2] = g * pos[1] * p
+        b[0] = g * pos[1] * pos[2] * dp
+        return np.zeros_like(b), b
+
+
+class Solenoid:
+    def __init__(self, b0, length, radius, start=0.0):
+        self.b0 = b0  # field in the middle of a long solenoid
+        self.length = length
+        self.radius = radius  # radius of the coil
+        self.start = start
+
+    def fields(self, pos):
+        # B_x(x) on axis from the two coil ends, B_r = -r/2 dB_x/dx
+        r2 = self.radius**2
+        u0 = pos[0] - self.start
+        u1 = u0 - self.length
+        s0 = np.sqrt(u0**2 + r2)
+        s1 = np.sqrt(u1**2 + r2)
+        bx = 0.5 * self.b0 * (u0 / s0 - u1 / s1)
+        dbx = 0.5 * self.b0 * r2 * (1 / s0**3 - 1 / s1**3)
+        b = np.empty_like(pos, dtype=np.float64)
+        b[0] = bx
+        b[1] = -0.5 * pos[1] * dbx
+        b[2] = -0.5 * pos[2] * dbx
+        return np.zeros_like(b), b
+
+
+class Superposition:
+    def __init__(self, *sources):
+        self.sources = sources
+
+    def fields(self, pos):
+        e = np.zeros_like(pos, dtype=np.float64)
+        b = np.zeros_like(pos, dtype=np.float64)
+        for source in self.sources:
+            de, db = source.fields(pos)
+            e += de
+            b += db
+        return e, b
+
+
+class FieldMap:
+    def __init__(self, data, origin, spacing):
+        self.data = data  # (6, nx, ny, nz), array or memory map
+        self.origin = _column(origin)  # position of node (0, 0, 0)
+        self.spacing = _column(spacing)  # distance between nodes
+        self.shape = np.array(data.shape[1:])
+        self._flat = data.reshape(6, -1)  # view, no copy of memory maps
+        self.path = None  # file of a map from load()
+
+    @classmethod
+    def load(cls, path):  # memory-mapped map from file
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a field map")
+            (length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(length))
+        data = np.memmap(
+            path, dtype="<f4", mode="r", offset=len(MAGIC) + 4 + length,
+            shape=(6,) + tuple(header["shape"]))
+        field = cls(data, header["origin"], header["spacing"])
+        field.path = path
+        return field
+
+    def __getstate__(self):  # path of a loaded map, else data (no view)
+        if self.path is not None:
+            return dict(path=self.path)
+        return dict(data=self.data, origin=self.origin, spacing=self.spacing)
+
+    def __setstate__(self, state):
+        if "path" in state:
+            self.__dict__.update(vars(FieldMap.load(state["path"])))
+        else:
+            self.__init__(state["data"], state["origin"][:, 0],
+                          state["spacing"][:, 0])
+
+    @classmethod
+    def sample(cls, source, origin, spacing, shape, path=None):
+        # grid of source fields; written slab by slab (over x) to a file
+        # and memory-mapped if path is given, in memory otherwise
+        shape = tuple(int(n) for n in shape)
+        if path is None:
+            data = np.zeros((6,) + shape, dtype=np.float32)
+        else:
+            header = json.dumps(dict(
+                origin=list(map(float, to_array(origin))),
+                spacing=list(map(float, to_array(spacing))),
+                shape=list(shape))).encode()
+            size = len(MAGIC) + 4 + len(header)
+            header += b" " * (-size % 64)
+            with open(path, "wb") as f:
+                f.write(MAGIC + struct.pack("<I", len(header)) + header)
+            data = np.memmap(
+                path, dtype="<f4", mode="r+", offset=size + (-size % 64),
+                shape=(6,) + shape)
+
+        origin, spacing = to_array(origin), to_array(spacing)
+        y, z = np.meshgrid(
+            origin[1] + spacing[1] * np.arange(shape[1]),
+            origin[2] + spacing[2] * np.arange(shape[2]), indexing="ij")
+        pos = np.empty((3, y.size))
+        pos[1], pos[2] = y.ravel(), z.ravel()
+        for i in range(shape[0]):
+            pos[0] = origin[0] + spacing[0] * i
+            e, b = source.fields(pos)
+            data[:3, i] = e.reshape(3, *shape[1:])
+            data[3:, i] = b.reshape(3, *shape[1:])
+
+        if path is None:
+            return cls(data, origin, spacing)
+        data.flush()
+        del data
+        return cls.load(path)
+
+    def fields(self, pos):
+        # trilinear interpolation: 8 gathers of the corner nodes of the
+        # cells with the particles, weights are products of the fractions
+        u = (pos - self.origin) / self.spacing
+        n = self.shape[:, np.newaxis]
+        inside = np.all((u >= 0) & (u <= n - 1), axis=0)
+        i0 = np.clip(np.floor(u), 0, n - 2).astype(np.intp)
+        f = u - i0  # fractions in the cells, 0 ... 1
+        g = 1 - f
+        strides = np.array([n[1, 0] * n[2, 0], n[2, 0], 1])
+        base = strides @ i0
+
+        out = np.zeros((6, pos.shape[1]))
+        part = np.empty(out.shape, self._flat.dtype)  # reused by corners
+        corner = np.empty_like(base)
+        w = np.empty(pos.shape[1])
+        for dx in (0, 1):
+            wx = f[0] if dx else g[0]
+            for dy in (0, 1):
+                wxy = wx * (f[1] if dy else g[1])
+                for dz in (0, 1):
+                    np.multiply(wxy, f[2] if dz else g[2], out=w)
+                    np.add(base, dx * strides[0] + dy * strides[1] + dz,
+                           out=corner)
+                    np.take(self._flat, corner, axis=1, out=part)
+                    part *= w
+                    out += part
+        out[:, ~inside] = 0  # no field outside the map
+        return out[:3], out[3:]
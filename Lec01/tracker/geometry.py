@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# Apertures for whole particle arrays (positions of shape (3, n)).
+#     outside(pos)      - boundary function, >= 0 outside, < 0 inside
+#                         (squared radius for cylinders, no sqrt)
+#     inside(pos)       - boolean mask, same strict checks as
+#                         check_collision() of the scripts
+#     crossing(p0, p1)  - (s, face): fraction of the step p0 -> p1 where
+#                         the straight segment leaves the aperture, and
+#                         the face it leaves through; the crossing point
+#                         is interpolate(p0, p1, s)
+# Box is the box of Lec01.py, Cylinder is the pipe of Lec01_movement.py
+# (axis along x), Composite is the intersection of several apertures.
+
+import numpy as np
+
+from tracker.integrators import to_array
+
+
+def _column(vec):
+    return to_array(vec)[:, np.newaxis]
+
+
+class Box:
+    faces = 6  # -x, +x, -y, +y, -z, +z
+
+    def __init__(self, xlen, ylen, zlen, center=(0, 0, 0)):
+        self.half = _column((xlen / 2, ylen / 2, zlen / 2))
+        self.center = _column(center)
+
+    def outside(self, pos):
+        return np.max(np.abs(pos - self.center) - self.half, axis=0)
+
+    def inside(self, pos):
+        return np.all(np.abs(pos - self.center) < self.half, axis=0)
+
+    def crossing(self, p0, p1):
+        d = p1 - p0
+        lo = self.center - self.half - p0  # distances to the faces
+        hi = self.center + self.half - p0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = np.where(d > 0, hi / d, np.where(d < 0, lo / d, np.inf))
+        axis = np.argmin(s, axis=0)
+        cols = np.arange(p0.shape[1])
+        face = 2 * axis + (d[axis, cols] > 0)
+        return np.clip(s[axis, cols], 0, 1), face
+
+
+class Cylinder:
+    faces = 3  # entrance plane, exit plane, wall
+
+    def __init__(self, length, radius, start=(0, 0, 0)):
+        self.length = length
+        self.radius = radius
+        self.start = _column(start)
+
+    def outside(self, pos):
+        d = pos - self.start
+        return np.maximum(
+            d[1]**2 + d[2]**2 - self.radius**2,
+            np.maximum(-d[0], d[0] - self.length))
+
+    def inside(self, pos):
+        d = pos - self.start
+        return (d[1]**2 + d[2]**2 < self.radius**2) \
+            & (d[0] > 0) & (d[0] < self.length)
+
+    def crossing(self, p0, p1):
+        a0 = p0 - self.start
+        d = p1 - p0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s_in = np.where(d[0] < 0, -a0[0] / d[0], np.inf)
+            s_out = np.where(d[0] > 0, (self.length - a0[0]) / d[0], np.inf)
+
+            # |a0 + s d|^2 = R^2 in the (y, z) plane, larger root
+            a = d[1]**2 + d[2]**2
+            b = a0[1] * d[1] + a0[2] * d[2]
+            c = a0[1]**2 + a0[2]**2 - self.radius**2
+            disc = np.maximum(b * b - a * c, 0)
+            s_wall = np.where(a > 0, (-b + np.sqrt(disc)) / a, np.inf)
+
+        s = np.array([s_in, s_out, s_wall])
+        face = np.argmin(s, axis=0)
+        return np.clip(s[face, np.arange(p0.shape[1])], 0, 1), face
+
+
+class Composite:  # particle must be inside all apertures
+    def __init__(self, *apertures):
+        self.apertures = apertures
+        self.faces = sum(ap.faces for ap in apertures)
+
+    def outside(self, pos):
+        return np.max([ap.outside(pos) for ap in self.apertures], axis=0)
+
+    def inside(self, pos):
+        mask = self.apertures[0].inside(pos)
+        for ap in self.apertures[1:]:
+            mask &= ap.inside(pos)
+        return mask
+
+    def crossing(self, p0, p1):
+        s = np.ones(p0.shape[1])
+        face = np.zeros(p0.shape[1], dtype=np.int64)
+        offset = 0
+        for ap in self.apertures:
+            s_ap, face_ap = ap.crossing(p0, p1)
+            left = ~ap.inside(p1)  # only apertures that were really left
+            first = left & (s_ap <= s)
+            s = np.where(first, s_ap, s)
+            face = np.where(first, face_ap + offset, face)
+            offset += ap.faces
+        return s, face
+
+
+def interpolate(p0, p1, s):  # point at fraction s of the step p0 -> p1
+    return p0 + s * (p1 - p0)
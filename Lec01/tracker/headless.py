@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+# Headless stand-ins for the vpython objects used in the lectures.
+# They keep the same attributes as canvas, sphere, arrow, label, slider,
+# button, ... but draw nothing and never talk to a browser, so the
+# Proton/Particle classes run unchanged in batch jobs.
+# The scripts pick this backend when PHYSTECH_HEADLESS=1 is set:
+#     PHYSTECH_HEADLESS=1 python -c "import Lec01_movement as m; m.launch()"
+
+import os
+from math import cos, sin, pi, pow, sqrt  # noqa: F401 (as vpython exports)
+
+
+def enabled():  # True when scripts should use this backend
+    return os.environ.get("PHYSTECH_HEADLESS", "") not in ("", "0")
+
+
+class vector:  # no in-place operators, so objects may share one vector
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        if isinstance(x, vector):  # copy, as vector(v) in vpython
+            x, y, z = x.x, x.y, x.z
+        self.x, self.y, self.z = float(x), float(y), float(z)
+
+    def __add__(self, other):
+        return vector(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return vector(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __mul__(self, k):
+        return vector(self.x * k, self.y * k, self.z * k)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, k):
+        return vector(self.x / k, self.y / k, self.z / k)
+
+    def __neg__(self):
+        return vector(-self.x, -self.y, -self.z)
+
+    def __pos__(self):
+        return vector(self)
+
+    def __eq__(self, other):
+        return isinstance(other, vector) \
+            and (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.z)[i]
+
+    def __repr__(self):
+        return f"<{self.x:.6g}, {self.y:.6g}, {self.z:.6g}>"
+
+    @property
+    def mag(self):
+        return sqrt(self.mag2)
+
+    @property
+    def mag2(self):
+        return self.x * self.x + self.y * self.y + self.z * self.z
+
+    @property
+    def hat(self):
+        mag = self.mag
+        return vector(self) if mag == 0 else self / mag
+
+    def norm(self):
+        return self.hat
+
+    def dot(self, other):
+        return dot(self, other)
+
+    def cross(self, other):
+        return cross(self, other)
+
+
+def dot(a, b):
+    return a.x * b.x + a.y * b.y + a.z * b.z
+
+
+def cross(a, b):
+    return vector(
+        a.y * b.z - a.z * b.y,
+        a.z * b.x - a.x * b.z,
+        a.x * b.y - a.y * b.x)
+
+
+def mag(a):
+    return a.mag
+
+
+def rate(frequency):  # nothing to wait for without a browser
+    pass
+
+
+class color:
+    red = vector(1, 0, 0)
+    green = vector(0, 1, 0)
+    blue = vector(0, 0, 1)
+    yellow = vector(1, 1, 0)
+    orange = vector(1, 0.6, 0)
+    cyan = vector(0, 1, 1)
+    magenta = vector(1, 0, 1)
+    black = vector(0, 0, 0)
+    white = vector(1, 1, 1)
+
+
+class _Object:  # stores all keyword arguments as attributes
+    defaults = {}
+
+    def __init__(self, **kwargs):
+        for key, value in {**self.defaults, **kwargs}.items():
+            setattr(self, key, value)
+
+
+class _Camera(_Object):
+    defaults = dict(pos=vector(0, 0, 10), axis=vector(0, 0, -10))
+    followed = None
+
+    def follow(self, obj):
+        self.followed = obj
+
+
+class canvas(_Object):
+    defaults = dict(width=640, height=400, title="", caption="")
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.camera = _Camera()
+
+    def append_to_caption(self, text):
+        self.caption += text
+
+
+class _Shape(_Object):
+    defaults = dict(
+        pos=vector(0, 0, 0), axis=vector(1, 0, 0), color=color.white,
+        opacity=1, visible=True)
+
+
+class box(_Shape):
+    defaults = dict(_Shape.defaults, size=vector(1, 1, 1))
+
+
+class cylinder(_Shape):
+    defaults = dict(_Shape.defaults, radius=1)
+
+    @property
+    def length(self):
+        return self.axis.mag
+
+
+class arrow(_Shape):
+    defaults = dict(_Shape.defaults, shaftwidth=None)
+
+
+class label(_Shape):
+    defaults = dict(
+        _Shape.defaults, text="", xoffset=0, yoffset=0, space=0,
+        height=13, border=5, font="sans")
+
+
+class sphere(_Shape):
+    defaults = dict(
+        _Shape.defaults, radius=1, make_trail=False, trail_type="curve")
+
+    def clear_trail(self):
+        pass
+
+
+class curve(_Shape):
+    defaults = dict(_Shape.defaults, radius=0, retain=-1)
+    npoints = 0  # only the number of points is kept
+
+    def append(self, *points):
+        self.npoints += len(points)
+        if self.retain >= 0:
+            self.npoints = min(self.npoints, self.retain)
+
+    def modify(self, n, **kwargs):
+        pass
+
+    def clear(self):
+        self.npoints = 0
+
+
+class _Widget(_Object):
+    defaults = dict(bind=None, text="")
+
+
+class button(_Widget):
+    def press(self):  # same as clicking the button in the browser
+        if self.bind is not None:
+            self.bind()
+
+
+class slider(_Widget):
+    defaults = dict(_Widget.defaults, min=0, max=1, step=0.1, value=0)
+
+    def move_to(self, value):  # same as dragging the slider to value
+        self.value = value
+        if self.bind is not None:
+            self.bind()
+
+
+class wtext(_Widget):
+    pass
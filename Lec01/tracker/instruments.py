@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# Counters and timers of the frame loop (see tasks.py), to tell whether
+# a slow demo is CPU-bound (physics) or render-bound (scene updates).
+# Phases of every tick
+#     slider   - slider changes applied (params.py)
+#     physics  - steps of all running launches
+#     render   - bodies, arrows and labels of all launches
+#     trail    - trail growth of all launches
+#     wait     - rest of the frame, given back to the event loop
+# plus frames, dropped frames (tick longer than the frame period),
+# requested vs achieved step rate, and totals of every finished launch.
+# Off by default: phase() then returns one shared no-op context, so the
+# cost is an attribute check per phase and frame, nothing per step.
+# With sample_every = N only every N-th frame is timed (and the totals
+# are extrapolated), for long runs where even that matters.
+#
+#     instruments.enabled = True
+#     ...launches...
+#     instruments.save("profile.json")   # or caption() for a wtext
+
+import json
+from contextlib import nullcontext
+from time import perf_counter
+
+PHASES = ("slider", "physics", "render", "trail", "wait")
+_OFF = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        seconds = perf_counter() - self.start
+        total = self.stats[self.name]
+        total[0] += 1
+        total[1] += seconds
+        total[2] = max(total[2], seconds)
+
+
+class Instruments:
+    def __init__(self, enabled=False, sample_every=1):
+        self.enabled = enabled
+        self.sample_every = sample_every  # time every n-th frame only
+        self.reset()
+
+    def reset(self):
+        self.phases = {name: [0, 0.0, 0.0] for name in PHASES}  # n, s, max
+        self.frames = 0  # all frames, sampled or not
+        self.dropped = 0  # frames longer than the frame period
+        self.steps = 0
+        self.requested = 0  # steps asked for by fixed substeps
+        self.started = None  # first frame
+        self.launches = []  # totals of finished launches
+        self._timers = {name: _Timer(self.phases, name) for name in PHASES}
+
+    @property
+    def sampling(self):  # True if the current frame is timed
+        return self.enabled and self.frames % self.sample_every == 0
+
+    def phase(self, name):  # context timing a phase of the current frame
+        if not self.sampling:
+            return _OFF
+        return self._timers[name]
+
+    def frame(self, seconds, steps, requested, period):
+        # after every tick: its duration, steps done and asked for
+        if not self.enabled:
+            return
+        if self.started is None:
+            self.started = perf_counter() - seconds
+        self.frames += 1
+        self.steps += steps
+        self.requested += requested
+        if seconds > period:
+            self.dropped += 1
+
+    def finished(self, task):  # totals of a finished or cancelled launch
+        if not self.enabled:
+            return
+        wall = perf_counter() - task.started
+        self.launches.append(dict(
+            name=task.name, state=task.state, frames=task.frames,
+            steps=task.steps, seconds=wall,
+            steps_per_second=task.steps / wall if wall else 0.0))
+
+    def summary(self):  # dict of all counters, estimated totals
+        wall = perf_counter() - self.started if self.started else 0.0
+        phases = {}
+        for name, (n, seconds, longest) in self.phases.items():
+            scale = self.frames / n if n else 0.0  # sampled frames only
+            phases[name] = dict(
+                seconds=seconds * scale, mean=seconds / n if n else 0.0,
+                max=longest, share=seconds * scale / wall if wall else 0.0)
+        return dict(
+            seconds=wall, frames=self.frames, dropped=self.dropped,
+            fps=self.frames / wall if wall else 0.0,
+            steps=self.steps,
+            steps_per_second=self.steps / wall if wall else 0.0,
+            requested_steps_per_second=(
+                self.requested / wall if wall and self.requested else None),
+            phases=phases, launches=self.launches)
+
+    def save(self, path):  # summary as JSON
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+            f.write("\n")
+
+    def caption(self):  # one line for a wtext readout
+        s = self.summary()
+        shares = ", ".join(
+            f"{name} {100 * p['share']:.0f}%"
+            for name, p in s["phases"].items())
+        return (f"{s['fps']:.0f} fps, {s['dropped']} dropped, "
+                f"{s['steps_per_second']:.0f} steps/s ({shares})")
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+# Integrators for motion of charged particle in electromagnetic field.
+# Every integrator has the same signature
+#     step(pos, vel, qm, e, b, dt, c) -> (pos, vel, acc)
+# and works both for one particle (arrays of shape (3,)) and for
+# ensembles (arrays of shape (3, n), see ensemble.py).
+#
+# euler      - explicit Euler, as in Proton.move and Particle.move
+# boris      - Boris rotation, volume preserving, no energy drift in pure B
+# boris_rel  - relativistic Boris, pushes momentum u = gamma v per unit mass
+# The Boris integrators are leapfrog schemes: vel is half a step behind
+# pos (v(t - dt/2) in, v(t + dt/2) out), and they are second order only
+# when started so. half_step() moves a velocity by half a step: callers
+# start with half_step(step, ..., -dt) from the velocity at t = 0 and
+# report half_step(step, ..., dt), the velocity at the time of pos.
+# Buttons of the scripts cycle through these and "adaptive" (adaptive.py,
+# steps from a tolerance, not of this signature).
+
+import numpy as np
+
+C_LIGHT = 100.0  # speed of light in arbitrary units of the lectures
+
+
+def to_array(vec):  # vpython vector / sequence -> numpy array of shape (3,)
+    if hasattr(vec, "x"):
+        return np.array([vec.x, vec.y, vec.z], dtype=np.float64)
+    return np.asarray(vec, dtype=np.float64)
+
+
+def cross(a, b):  # cross product along the first axis (np.cross is slow)
+    return np.array([a[1] * b[2] - a[2] * b[1],
+                     a[2] * b[0] - a[0] * b[2],
+                     a[0] * b[1] - a[1] * b[0]])
+
+
+def dot(a, b):  # dot product along the first axis
+    return np.einsum("i...,i...->...", a, b)
+
+
+def euler(pos, vel, qm, e, b, dt, c=C_LIGHT):
+    # electric + magnetic field forces F = ma = q (E + v x B)
+    acc = qm * (e + cross(vel, b))
+    vel = vel + acc * dt  # a = dv/dt
+    pos = pos + vel * dt  # v = dx/dt
+    return pos, vel, acc
+
+
+def boris_kick(vel, qm, e, b, dt, c=C_LIGHT):  # velocity dt later
+    h = 0.5 * qm * dt
+    v_minus = vel + h * e  # first half of electric kick
+
+    t = h * b  # rotation by magnetic field
+    s = 2 * t / (1 + dot(t, t))
+    v_prime = v_minus + cross(v_minus, t)
+    v_plus = v_minus + cross(v_prime, s)
+
+    return v_plus + h * e  # second half of electric kick
+
+
+def boris(pos, vel, qm, e, b, dt, c=C_LIGHT):
+    vel_new = boris_kick(vel, qm, e, b, dt)
+    pos = pos + vel_new * dt
+    return pos, vel_new, (vel_new - vel) / dt
+
+
+def gamma_of_velocity(vel, c=C_LIGHT):  # 1 / sqrt(1 - v^2/c^2)
+    return 1 / np.sqrt(1 - dot(vel, vel) / c**2)
+
+
+def gamma_of_momentum(u, c=C_LIGHT):  # sqrt(1 + u^2/c^2), u = gamma v
+    return np.sqrt(1 + dot(u, u) / c**2)
+
+
+def boris_relativistic_kick(vel, qm, e, b, dt, c=C_LIGHT):
+    h = 0.5 * qm * dt
+    u_minus = vel * gamma_of_velocity(vel, c) + h * e
+
+    t = h * b / gamma_of_momentum(u_minus, c)  # rotation at fixed gamma
+    s = 2 * t / (1 + dot(t, t))
+    u_prime = u_minus + cross(u_minus, t)
+    u_plus = u_minus + cross(u_prime, s)
+
+    u = u_plus + h * e
+    return u / gamma_of_momentum(u, c)
+
+
+def boris_relativistic(pos, vel, qm, e, b, dt, c=C_LIGHT):
+    vel_new = boris_relativistic_kick(vel, qm, e, b, dt, c)
+    pos = pos + vel_new * dt
+    return pos, vel_new, (vel_new - vel) / dt
+
+
+INTEGRATORS = {
+    "euler": euler,
+    "boris": boris,
+    "boris_rel": boris_relativistic,
+}
+
+
+KICKS = {  # velocity updates of the leapfrog integrators
+    boris: boris_kick,
+    boris_relativistic: boris_relativistic_kick,
+}
+
+
+def half_step(step, vel, qm, e, b, dt, c=C_LIGHT):
+    # velocity dt / 2 later (earlier for dt < 0) for leapfrog integrator
+    # step, vel itself for the others
+    kick = KICKS.get(step)
+    if kick is None:
+        return vel
+    return kick(vel, qm, e, b, 0.5 * dt, c)
+
+
+def get_integrator(name):  # integrator by its name
+    try:
+        return INTEGRATORS[name]
+    except KeyError:
+        if name == ADAPTIVE:  # a name of the buttons, not a fixed step
+            raise ValueError(
+                f"{ADAPTIVE!r} steps are taken by AdaptiveEnsemble "
+                f"(adaptive.py), choose one of {', '.join(INTEGRATORS)} "
+                f"for fixed steps") from None
+        raise ValueError(
+            f"Unknown integrator {name!r}, "
+            f"choose one of {', '.join(INTEGRATORS)}") from None
+
+
+ADAPTIVE = "adaptive"  # adaptive steps of launches, see adaptive.py
+
+
+def next_integrator(name):  # cycles through integrators (for buttons)
+    names = list(INTEGRATORS) + [ADAPTIVE]
+    return names[(names.index(name) + 1) % len(names)]
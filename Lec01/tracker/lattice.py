@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# Multi-turn tracking with transfer maps instead of steps.
+# The state of particles is a (6, n) array X of rows x, y, z, vx, vy, vz
+# (positions on top of velocities, as Ensemble.pos and Ensemble.vel).
+# An element moves X over its duration by a Taylor map
+#     X1 = c + R X + T(X, X)      (T only for second-order maps)
+# built either
+#     exactly, from the closed-form motion in uniform fields (analytic.py:
+#              the orbit is affine in the initial state for fixed E, B),
+#     or from tracked orbits (Ensemble, any field source and integrator)
+#              around a reference state by central differences.
+# Maps of the elements are composed (truncated to second order) into one
+# map per turn, and a turn of the whole ensemble is one batched matrix
+# product. For linear maps the turns between two outputs are jumped with
+# the map raised to that power, so millions of turns cost a few products.
+# Maps use absolute coordinates: a ring needs a reference orbit that
+# closes every turn (e.g. gyration in B), and a straight periodic
+# channel only works with elements whose maps do not depend on x (hard
+# edges, uniform fields), since x keeps growing turn by turn.
+#
+#     ring = Lattice([drift_map(1.0), uniform_field_map(0.5, e, b, 2.0)])
+#     turns = ring.track(to_state(pos, vel), n_turns=10**6, every=1000)
+#     tunes(ring.one_turn().R), stable(ring.one_turn().R)
+# Long jobs take a Checkpoint (checkpoint.py) and continue after a restart;
+# their outputs go to a memory-mapped .npy file (path, or next to the
+# snapshot), so a snapshot only holds the state and the outputs done, and
+# every output is written once.
+
+import numpy as np
+
+from tracker.analytic import UniformFieldOrbit
+from tracker.ensemble import Ensemble
+
+
+def to_state(pos, vel):  # (6, n) state from (3, n) positions, velocities
+    return np.concatenate([np.asarray(pos, float), np.asarray(vel, float)])
+
+
+def from_state(state):  # (pos, vel) of a state
+    return state[:3], state[3:]
+
+
+class TransferMap:
+    def __init__(self, R, c=None, T=None):
+        self.R = np.asarray(R, dtype=np.float64)  # (6, 6) linear part
+        self.c = np.zeros(6) if c is None else np.asarray(c, float)
+        self.T = T  # (6, 6, 6) second-order part or None
+
+    def __call__(self, state):  # maps (6, n) states (or (6,) state)
+        out = self.R @ state
+        out += self.c if state.ndim == 1 else self.c[:, np.newaxis]
+        if self.T is not None:
+            out += np.einsum("ijk,j...,k...->i...", self.T, state, state)
+        return out
+
+    def then(self, other):  # map of self followed by other, to 2nd order
+        R = other.R @ self.R
+        c = other.c + other.R @ self.c
+        if other.T is None and self.T is None:
+            return TransferMap(R, c)
+        T = np.zeros((6, 6, 6))
+        if self.T is not None:
+            T += np.einsum("ij,jkl->ikl", other.R, self.T)
+        if other.T is not None:
+            tb = other.T
+            c += np.einsum("ijk,j,k->i", tb, self.c, self.c)
+            R += np.einsum("ijk,j,kl->il", tb, self.c, self.R)
+            R += np.einsum("ijk,jl,k->il", tb, self.R, self.c)
+            T += np.einsum("ijk,jl,km->ilm", tb, self.R, self.R)
+            if self.T is not None:
+                T += np.einsum("ijk,j,klm->ilm", tb, self.c, self.T)
+                T += np.einsum("ijk,jlm,k->ilm", tb, self.T, self.c)
+        return TransferMap(R, c, T)
+
+    def power(self, n):  # map of n passes (linear maps only)
+        if self.T is not None:
+            raise ValueError("power() needs a linear map")
+        result = TransferMap(np.eye(6))
+        base = self
+        while n:  # repeated squaring, O(log n) products
+            if n & 1:
+                result = result.then(base)
+            base = base.then(base)
+            n >>= 1
+        return result
+
+
+def drift_map(duration):  # free flight, x += v t
+    R = np.eye(6)
+    R[:3, 3:] = duration * np.eye(3)
+    return TransferMap(R)
+
+
+def uniform_field_map(qm, e_vec, b_vec, duration):
+    # exact map of uniform fields: columns from unit initial states
+    def state(x0):
+        orbit = UniformFieldOrbit(x0[:3], x0[3:], qm, e_vec, b_vec)
+        return np.concatenate(orbit.state(duration))
+    c = state(np.zeros(6))
+    R = np.column_stack([state(unit) - c for unit in np.eye(6)])
+    return TransferMap(R, c)
+
+
+def tracked_map(duration, dt, qm=0.5, e_vec=(0, 0, 0), b_vec=(0, 0, 0),
+                field=None, integrator="boris", reference=None,
+                scale=(1e-3, 1e-3), order=1):
+    # map of tracked orbits around reference state (6,) by central
+    # differences of size scale = (position, velocity)
+    r0 = np.zeros(6) if reference is None else np.asarray(reference, float)
+    h = np.repeat(np.asarray(scale, float), 3)
+    shifts = [np.zeros(6)]
+    for i in range(6):
+        shifts += [h[i] * np.eye(6)[i], -h[i] * np.eye(6)[i]]
+    pairs = [(i, j) for i in range(6) for j in range(i + 1, 6)]
+    if order == 2:
+        for i, j in pairs:
+            for si, sj in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+                shifts.append(si * h[i] * np.eye(6)[i]
+                              + sj * h[j] * np.eye(6)[j])
+    start = r0[:, np.newaxis] + np.array(shifts).T
+
+    ens = Ensemble(start.shape[1], q=qm, m=1.0, integrator=integrator)
+    ens.pos[:], ens.vel[:] = from_state(start)
+    ens.run(int(round(duration / dt)), dt, e_vec, b_vec, field=field)
+    out = to_state(ens.pos, ens.vel)
+
+    f0 = out[:, 0]
+    J = np.empty((6, 6))
+    H = np.zeros((6, 6, 6))  # second derivatives
+    for i in range(6):
+        plus, minus = out[:, 1 + 2 * i], out[:, 2 + 2 * i]
+        J[:, i] = (plus - minus) / (2 * h[i])
+        H[:, i, i] = (plus - 2 * f0 + minus) / h[i]**2
+    if order == 1:
+        return TransferMap(J, f0 - J @ r0)
+    for k, (i, j) in enumerate(pairs):
+        pp, pm, mp, mm = out[:, 13 + 4 * k:17 + 4 * k].T
+        H[:, i, j] = H[:, j, i] = (pp - pm - mp + mm) / (4 * h[i] * h[j])
+    # Taylor expansion around r0 rewritten around the origin
+    T = 0.5 * H
+    R = J - np.einsum("ijk,k->ij", H, r0)
+    c = f0 - J @ r0 + np.einsum("ijk,j,k->i", T, r0, r0)
+    return TransferMap(R, c, T)
+
+
+class Lattice:
+    def __init__(self, elements):
+        self.elements = list(elements)  # transfer maps in order
+
+    def one_turn(self):  # composed map of one turn
+        turn = TransferMap(np.eye(6))
+        for element in self.elements:
+            turn = turn.then(element)
+        return turn
+
+    def track(self, state, n_turns, every=1, turn_map=None,
+              checkpoint=None, path=None):
+        # states after every `every`-th turn, array (n_turns // every, 6, n);
+        # path - .npy file of the outputs, memory-mapped (default with a
+        # checkpoint: <checkpoint.path>.out.npy); checkpoint (checkpoint.py)
+        # counts outputs, resumes from snapshot
+        turn = turn_map or self.one_turn()
+        jump = turn.power(every) if turn.T is None else None
+        shape = (n_turns // every,) + state.shape
+        if checkpoint is not None and path is None:
+            path = checkpoint.path + ".out.npy"
+        done = 0
+        snapshot = checkpoint.load() if checkpoint is not None else None
+        if snapshot is not None:
+            arrays, meta = snapshot
+            done = meta["outputs"]
+            state = arrays["state"]
+            out = np.load(path, mmap_mode="r+")
+        elif path is not None:
+            out = np.lib.format.open_memmap(path, "w+", np.float64, shape)
+        else:
+            out = np.empty(shape)
+        for k in range(done, len(out)):
+            if jump is not None:
+                state = jump(state)
+            else:
+                for _ in range(every):
+                    state = turn(state)
+            out[k] = state
+            if checkpoint is not None and checkpoint.due(k + 1):
+                out.flush()  # outputs on disk before a snapshot counts them
+                checkpoint.save(dict(state=state), dict(outputs=k + 1))
+        if path is not None:
+            out.flush()
+        return out
+
+
+def tunes(R):  # fractional tunes of the eigenvalue pairs of a turn
+    eig = np.linalg.eigvals(R)
+    angles = np.angle(eig[eig.imag > 1e-12])
+    return np.sort(angles / (2 * np.pi))
+
+
+def stable(R, tol=1e-9):  # all eigenvalues on (or inside) the unit circle
+    return bool(np.all(np.abs(np.linalg.eigvals(R)) <= 1 + tol))
+
+
+def tune_from_tracking(x):  # main frequency of turn-by-turn data (FFT)
+    x = np.asarray(x, float) - np.mean(x)
+    spectrum = np.abs(np.fft.rfft(x * np.hanning(len(x))))
+    return (np.argmax(spectrum[1:]) + 1) / len(x)
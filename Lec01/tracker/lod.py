@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# Level of detail of scene updates: which objects are worth writing to.
+# Every attribute write of a vpython object is scene traffic, whether the
+# object is seen or not. SceneDetail keeps track of
+#     hidden objects      - show(obj, False): no writes at all,
+#     off-screen objects  - on_screen(where) is False: no writes,
+#     labels              - moved only every label_every-th frame,
+# and keeps the latest update of every skipped object pending. Updates
+# are functions computing the attributes, so a skipped update costs no
+# vector arithmetic either; a pending one is computed from the state at
+# the time it is written, when the object is shown again (one write of
+# the catch-up) or its update is next due.
+#
+#     detail = SceneDetail(label_every=3)
+#     detail.update(arrow, lambda: dict(pos=p, axis=v))
+#     detail.update(arrow.label, lambda: dict(pos=p + v), label=True)
+#     detail.tick()                        # once per rendered frame
+#     detail.show(arrow, False, opacity=0)
+
+
+class SceneDetail:
+    def __init__(self, label_every=1, on_screen=None):
+        self.label_every = label_every  # frames between label moves
+        self.on_screen = on_screen  # on_screen(where) -> bool, None - all
+        self.frame = 0
+        self.hidden = set()  # ids of hidden objects
+        self.pending = {}  # id -> (obj, compute) of skipped updates
+        self.writes = 0  # attribute writes done, for profiling
+
+    def shown(self, obj):
+        return id(obj) not in self.hidden
+
+    def update(self, obj, compute, label=False, where=None):
+        # writes compute() (a dict of attributes) to obj if it is seen
+        # and due, else keeps it pending; True if written
+        key = id(obj)
+        if key in self.hidden or label and self.frame % self.label_every \
+                or where is not None and self.on_screen is not None \
+                and not self.on_screen(where):
+            self.pending[key] = (obj, compute)
+            return False
+        if self.pending:
+            self.pending.pop(key, None)
+        self._write(obj, compute())
+        return True
+
+    def _write(self, obj, attrs):
+        for name, value in attrs.items():
+            setattr(obj, name, value)
+        self.writes += len(attrs)
+
+    def show(self, obj, shown, **attrs):
+        # shows or hides obj by attrs (e.g. opacity=0 or visible=False);
+        # a shown object gets its pending update at once
+        key = id(obj)
+        if shown:
+            self.hidden.discard(key)
+        else:
+            self.hidden.add(key)
+        self._write(obj, attrs)
+        if shown and key in self.pending:
+            obj, compute = self.pending.pop(key)
+            self._write(obj, compute())
+
+    def catch_up(self):  # writes pending updates of all shown objects
+        for key in [k for k in self.pending if k not in self.hidden]:
+            obj, compute = self.pending.pop(key)
+            self._write(obj, compute())
+
+    def tick(self):  # after every rendered frame
+        self.frame += 1
+
+
+def in_view(scene, target, margin=2.0):
+    # on_screen test: objects within margin view ranges of the followed
+    # target (camera.follow), None if the scene has no range (headless);
+    # everything is on screen while the range is not a number (autoscale)
+    if getattr(scene, "range", None) is None:
+        return None
+
+    def on_screen(obj):
+        view = scene.range
+        if not isinstance(view, (int, float)) or not scene.height:
+            return True
+        aspect = max(1.0, scene.width / scene.height)
+        return (obj.pos - target.pos).mag <= margin * view * aspect
+    return on_screen
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Fixed time step physics with rendering decoupled from it.
+# Instead of rate(1/dt) around every physics step (rate(100000) can never
+# be reached by the browser), every rendered frame runs several physics
+# substeps and pushes scene objects only once (see tasks.py):
+#     substeps = N     - N steps per frame, sim time per frame is N dt
+#     substeps = None  - as many steps as fit into the budget of frame
+#                        time, so sim time per second grows with CPU speed
+# frame_step() rounds dt so that N dt is exactly one frame of sim time,
+# then integrators with different dt play launches at the same speed.
+# Either way a frame stops stepping when its budget is used up.
+
+from time import perf_counter
+
+CLOCK_CHECK = 64  # steps between clock readings
+
+
+def substeps_for(dt, fps, speed=1.0):  # steps per frame for given sim speed
+    return max(1, round(speed / (dt * fps)))
+
+
+def frame_step(dt, fps, speed=1.0):
+    # (substeps, dt) with dt next to the given one and substeps dt equal
+    # to speed / fps, the sim time of one frame
+    substeps = substeps_for(dt, fps, speed)
+    return substeps, speed / (fps * substeps)
+
+
+def advance(step, running, substeps=None, seconds=0.0):
+    # physics of one frame: up to substeps steps (no limit if None),
+    # as many as fit into `seconds` of wall time; returns steps done
+    steps = 0
+    start = perf_counter()
+    while running() and (substeps is None or steps < substeps):
+        batch = CLOCK_CHECK
+        if substeps is not None:
+            batch = min(batch, substeps - steps)
+        for _ in range(batch):
+            step()
+            steps += 1
+            if not running():
+                break
+        if perf_counter() - start > seconds:
+            break
+    return steps
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# Parameter store for the sliders of the scripts.
+# A slider callback only stores its value (set), which marks the
+# parameter dirty; nothing is recomputed there. Once per rendered frame
+# flush() runs every watcher whose parameters changed since the last
+# flush, each watcher at most once, in the order they were added - so a
+# burst of slider events during a drag costs one recompute and one batch
+# of scene updates per frame.
+# Derived values (velocity from v_mag, theta, phi, ...) are cached and
+# recomputed lazily, when read after one of their parameters changed.
+#
+#     params = Parameters(b=0, theta=0)
+#     params.watch({"b"}, update_field)     # runs in flush() after set()
+#     velocity = params.derived({"theta"}, lambda p: ...)
+#     velocity.value                        # computed once per change
+
+class Parameters:
+    def __init__(self, **values):
+        self.values = dict(values)
+        self.versions = dict.fromkeys(values, 0)  # bumped by every change
+        self.dirty = set()  # changed since the last flush
+        self.watchers = []  # (names, callback), see watch()
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def set(self, name, value):  # stores new value, no recomputation
+        if self.values.get(name) == value:
+            return
+        self.values[name] = value
+        self.versions[name] = self.versions.get(name, 0) + 1
+        self.dirty.add(name)
+
+    def update(self, **values):
+        for name, value in values.items():
+            self.set(name, value)
+
+    def watch(self, names, callback):  # callback() on flush if names changed
+        self.watchers.append((frozenset(names), callback))
+
+    def derived(self, names, compute):  # lazy value of compute(params)
+        return Derived(self, names, compute)
+
+    def flush(self):  # runs watchers of changed parameters, True if any
+        if not self.dirty:
+            return False
+        dirty, self.dirty = self.dirty, set()
+        for names, callback in self.watchers:
+            if names & dirty:
+                callback()
+        return True
+
+
+class Derived:
+    def __init__(self, params, names, compute):
+        self.params = params
+        self.names = frozenset(names)
+        self.compute = compute
+        self._versions = None  # versions of names at last computation
+        self._value = None
+
+    @property
+    def value(self):
+        versions = [self.params.versions.get(n, 0) for n in self.names]
+        if versions != self._versions:
+            self._value = self.compute(self.params)
+            self._versions = versions
+        return self._value
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# Recorded trajectories: launch once, replay many times without physics.
+# File layout
+#     magic  b"PTATRAJ1"
+#     uint32 length of header, header as JSON (launch parameters),
+#            padded with spaces to a multiple of 64 bytes
+#     frames of FRAME dtype: t (float64), pos, vel, acc (3 x float32)
+# The number of frames follows from the file size, so a recorder only
+# appends, and a replay memory-maps the frames: opening is instant for
+# any length, and seeking to time t is a binary search over the t column.
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from tracker.integrators import to_array
+
+MAGIC = b"PTATRAJ1"
+FRAME = np.dtype([
+    ("t", "<f8"), ("pos", "<f4", 3), ("vel", "<f4", 3), ("acc", "<f4", 3)])
+
+
+class Recorder:
+    def __init__(self, path, params, every=1, chunk=4096):
+        self.every = every  # records every n-th added state
+        self.calls = 0
+        self.buffer = np.zeros(chunk, dtype=FRAME)  # flushed when full
+        self.used = 0
+        self.frames = 0  # frames written to file
+
+        header = json.dumps(params).encode()
+        size = len(MAGIC) + 4 + len(header)
+        header += b" " * (-size % 64)
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def add(self, t, pos, vel, acc):  # adds state (vectors or arrays)
+        self.calls += 1
+        if (self.calls - 1) % self.every:
+            return
+        frame = self.buffer[self.used]
+        frame["t"] = t
+        frame["pos"] = to_array(pos)
+        frame["vel"] = to_array(vel)
+        frame["acc"] = to_array(acc)
+        self.used += 1
+        if self.used == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.buffer[:self.used].tofile(self.file)
+        self.frames += self.used
+        self.used = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Trajectory:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a recorded trajectory")
+            (length,) = struct.unpack("<I", f.read(4))
+            self.params = json.loads(f.read(length))  # launch parameters
+        offset = len(MAGIC) + 4 + length
+        if os.path.getsize(path) > offset:
+            self.frames = np.memmap(
+                path, dtype=FRAME, mode="r", offset=offset)
+        else:  # empty recording, nothing to map
+            self.frames = np.zeros(0, dtype=FRAME)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def duration(self):
+        return float(self.frames["t"][-1]) if len(self) else 0.0
+
+    def index_at(self, t):  # last frame at or before time t
+        i = np.searchsorted(self.frames["t"], t, side="right") - 1
+        return int(min(max(i, 0), len(self) - 1))
+
+    def state_at(self, t):  # (t, pos, vel, acc) of the frame at time t
+        frame = self.frames[self.index_at(t)]
+        return float(frame["t"]), frame["pos"], frame["vel"], frame["acc"]
+
+
+class Playback:
+    # replay as a task of the frame scheduler (tasks.py), like launches:
+    # step, render and running of scheduler.launch(..., substeps=1);
+    # show(t, pos, vel, acc) once per rendered frame, from time `start`,
+    # `speed` sim seconds per second
+    def __init__(self, trajectory, show, fps=30, start=0.0, speed=1.0):
+        self.trajectory = trajectory
+        self.show = show
+        self.start = start
+        self.frame_time = speed / fps  # sim time per frame
+        self.t = None  # time of the shown frame, None before the first
+
+    def step(self):
+        if self.t is None:
+            self.t = self.start
+        else:
+            self.t = min(self.t + self.frame_time, self.trajectory.duration)
+
+    def render(self):
+        if len(self.trajectory):
+            self.show(*self.trajectory.state_at(self.t))
+
+    def running(self):  # False once the last frame is shown
+        return self.t is None or self.t < self.trajectory.duration
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# Parameter scan over the sliders of Lec01_movement.py
+# (b, e, q, m, theta, phi) for acceptance maps of the pipe.
+# Points are split into chunks, every chunk is tracked as one ensemble
+# (per-particle fields, Boris integrator) on a process pool, and results
+# are written column by column to a compressed .npz file:
+#     status   - TRANSMITTED, LOST (pipe wall), REFLECTED (back through
+#                the entrance) or TRAPPED (still inside at t_max)
+#     x, y, z  - hit position,  tof - time of flight,  r_max - max radius
+#
+#     from tracker.scan import grid, scan
+#     result = scan(grid(b=np.arange(0, 20.5, 0.5), theta=range(0, 181, 5)),
+#                   output="acceptance.npz")
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from tracker.geometry import Cylinder, interpolate
+from tracker.integrators import get_integrator, half_step
+
+TRAPPED, TRANSMITTED, LOST, REFLECTED = 0, 1, 2, 3
+
+# Slider ranges (and values) of Lec01_movement.py
+SLIDER_RANGES = dict(
+    b=(0, 20), e=(-50, 50), q=(0, 1), m=(0.1, 1),
+    theta=(0, 180), phi=(0, 360))
+SLIDER_DEFAULTS = dict(b=0, e=0, q=0.5, m=1, theta=0, phi=0)
+
+# Geometry and launch of Lec01_movement.py
+SETTINGS = dict(
+    v_mag=10, start=(10, 0, 0), length=200, radius=100,
+    dt=0.01, t_max=100.0, integrator="boris")
+
+
+def grid(**axes):  # all combinations of given values, others at defaults
+    names = list(axes)
+    mesh = np.meshgrid(*[np.asarray(axes[k], float) for k in names],
+                       indexing="ij")
+    params = {k: v.ravel() for k, v in zip(names, mesh)}
+    return with_defaults(params)
+
+
+def random_samples(n, seed=0, **ranges):  # n uniform samples in ranges
+    rng = np.random.default_rng(seed)
+    ranges = ranges or SLIDER_RANGES
+    params = {k: rng.uniform(lo, hi, n) for k, (lo, hi) in ranges.items()}
+    return with_defaults(params)
+
+
+def with_defaults(params):  # fills missing parameters with slider defaults
+    n = len(next(iter(params.values())))
+    return {k: np.asarray(params[k], float) if k in params
+            else np.full(n, float(v)) for k, v in SLIDER_DEFAULTS.items()}
+
+
+def initial_state(params, v_mag, start):  # (3, n) positions and velocities
+    theta = np.radians(params["theta"])
+    phi = np.radians(params["phi"])
+    vel = v_mag * np.array([
+        np.cos(theta),
+        np.sin(theta) * np.sin(phi),
+        np.sin(theta) * np.cos(phi)])
+    pos = np.repeat(np.asarray(start, float)[:, None], len(theta), axis=1)
+    return pos, vel
+
+
+def track_chunk(params, settings):  # tracks one chunk, returns columns
+    n = len(params["b"])
+    pos, vel = initial_state(params, settings["v_mag"], settings["start"])
+    qm = params["q"] / params["m"]
+    zeros = np.zeros(n)
+    b = np.array([-params["b"], zeros, zeros])  # B along -x, as sliders
+    e = np.array([params["e"], zeros, zeros])
+    step = get_integrator(settings["integrator"])
+    dt = settings["dt"]
+    pipe = Cylinder(settings["length"], settings["radius"])
+    face_status = np.array([REFLECTED, TRANSMITTED, LOST], dtype=np.int8)
+
+    status = np.full(n, TRAPPED, dtype=np.int8)
+    hit = pos.copy()
+    tof = np.full(n, settings["t_max"])
+    r2_max = pos[1]**2 + pos[2]**2
+
+    active = np.arange(n)  # indices of particles still inside
+    vel = half_step(step, vel, qm, e, b, -dt)  # leapfrog start
+    t = 0.0
+    while active.size and t < settings["t_max"]:
+        pos, vel, _ = step(pos, vel, qm, e, b, dt)
+        t += dt
+        out = ~pipe.inside(pos)
+        left = out.any()
+        if left:  # exact crossing within the last step
+            done = active[out]
+            p1 = pos[:, out]
+            p0 = p1 - vel[:, out] * dt
+            s, face = pipe.crossing(p0, p1)
+            status[done] = face_status[face]
+            pos[:, out] = hit[:, done] = interpolate(p0, p1, s)
+            tof[done] = t - (1 - s) * dt
+
+        r2_max[active] = np.maximum(r2_max[active], pos[1]**2 + pos[2]**2)
+
+        if left:
+            keep = ~out  # only survivors are pushed further
+            active, pos, vel = active[keep], pos[:, keep], vel[:, keep]
+            qm, e, b = qm[keep], e[:, keep], b[:, keep]
+    hit[:, active] = pos
+
+    return dict(
+        status=status, x=hit[0].astype(np.float32),
+        y=hit[1].astype(np.float32), z=hit[2].astype(np.float32),
+        tof=tof.astype(np.float32),
+        r_max=np.sqrt(r2_max).astype(np.float32))
+
+
+def scan(params, workers=None, chunk=50000, output=None, **settings):
+    # tracks all points of params (see grid, random_samples) on
+    # `workers` processes (all cores by default), returns dict of columns
+    settings = {**SETTINGS, **settings}
+    params = with_defaults(params)
+    n = len(params["b"])
+    chunks = [{k: v[i:i + chunk] for k, v in params.items()}
+              for i in range(0, n, chunk)]
+
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(chunks) == 1:
+        parts = [track_chunk(c, settings) for c in chunks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(
+                track_chunk, chunks, [settings] * len(chunks)))
+
+    result = {k: v.astype(np.float32) for k, v in params.items()}
+    for key in parts[0]:
+        result[key] = np.concatenate([p[key] for p in parts])
+    if output is not None:
+        save(output, result, settings)
+    return result
+
+
+def save(path, result, settings):  # columnar, compressed result file
+    meta = {f"setting_{k}": np.asarray(v) for k, v in settings.items()}
+    np.savez_compressed(path, **result, **meta)
+
+
+def load(path):  # columns of a saved scan (without settings)
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files
+                if not k.startswith("setting_")}
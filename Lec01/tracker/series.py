@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+# Taylor series of relativistic kinetic energy (Lec01_manim.py)
+#     T / (m0 c^2) = 1/sqrt(1 - b^2) - 1 = sum_k c_k b^(2k),  b = v/c
+# with c_1 = 1/2 and c_(k+1) = c_k (2k + 1) / (2k + 2), i.e.
+# 1/2, 3/8, 5/16, 35/128, ... generated to any order.
+# All partial sums over a sample grid come from one cumulative pass
+# (running powers of b^2 and a prefix sum), O(order * samples) in total.
+
+from fractions import Fraction
+
+import numpy as np
+
+
+def kinetic_energy_coefficients(order, exact=False):  # c_1 ... c_order
+    c = [Fraction(1, 2)]
+    for k in range(1, order):
+        c.append(c[-1] * (2 * k + 1) / (2 * k + 2))
+    if exact:
+        return c
+    return np.array([float(ck) for ck in c])
+
+
+def partial_sums(coefficients, x2):
+    # sums_(k, i) = sum_(j <= k) c_j x2_i^(j+1), every row one more term
+    x2 = np.asarray(x2, dtype=np.float64)
+    powers = np.cumprod(
+        np.broadcast_to(x2, (len(coefficients),) + x2.shape), axis=0)
+    return np.cumsum(coefficients[:, np.newaxis] * powers, axis=0)
+
+
+def kinetic_energy_approximations(order, x):  # (order, len(x)) array
+    x = np.asarray(x, dtype=np.float64)
+    return partial_sums(kinetic_energy_coefficients(order), x * x)
+
+
+def kinetic_energy(x, cap=10.0):  # exact curve, cap for v >= c
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(x < 1.0, 1.0 / np.sqrt(1.0 - x * x) - 1.0, cap)
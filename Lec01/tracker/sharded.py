@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+# One large beam pushed by several processes (all cores by default).
+# The state of all particles lives in one multiprocessing.shared_memory
+# block, laid out as in ensemble.py ((3, n) rows of x, y, z, ...); every
+# worker owns a contiguous range of columns (a shard) and pushes it in
+# place, so no particle data is ever pickled, and the processes meet
+# once per run().
+# Lost particles are recorded (as Ensemble.lost_particles()) in the same
+# range of the lost-particle arrays, and survivors are compacted to the
+# front of their shard, so later steps only touch live columns.
+# Aperture, field source, integrator and c are sent to the workers once,
+# and again only when run() gets other ones; a memory-mapped FieldMap
+# travels as its path and every worker maps the file itself, so a run
+# only sends (n_steps, dt, t, e, b) and whether the leapfrog starts
+# again.
+# The block and the workers go with close(), the end of a with block, or
+# at the latest when the ensemble is garbage collected.
+#
+#     with ShardedEnsemble.from_arrays(pos, vel, workers=32) as beam:
+#         beam.run(1000, dt, e_vec, b_vec, aperture)
+#         state = beam.arrays()
+#
+# Only external fields (constant vectors or field sources from fields.py)
+# are supported: collective forces (spacecharge.py) need the whole beam.
+
+import multiprocessing as mp
+import os
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from tracker.ensemble import as_column
+from tracker.geometry import interpolate
+from tracker.integrators import C_LIGHT, KICKS, get_integrator, half_step
+
+
+def _layout(n, workers):  # name -> (offset, shape, dtype) in the block
+    arrays = dict(
+        pos=((3, n), "f8"), vel=((3, n), "f8"), half=((3, n), "f8"),
+        acc=((3, n), "f8"),
+        q=((n,), "f8"), m=((n,), "f8"), ids=((n,), "i8"),
+        lost_id=((n,), "i8"), lost_t=((n,), "f8"),
+        lost_pos=((3, n), "f8"), lost_vel=((3, n), "f8"),
+        lost_face=((n,), "i8"),
+        counts=((workers, 2), "i8"))  # live and lost particles of shards
+    layout, offset = {}, 0
+    for name, (shape, dtype) in arrays.items():
+        layout[name] = (offset, shape, dtype)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout, offset
+
+
+def _views(buf, layout):  # numpy arrays over the shared block
+    return {name: np.ndarray(shape, dtype, buf, offset)
+            for name, (offset, shape, dtype) in layout.items()}
+
+
+def _cols(a, out):  # columns of per-particle (3, n) array, or shared one
+    return a if a.shape[1] == 1 else a[:, out]
+
+
+def _run_shard(a, lo, shard, n_steps, dt, t, e, b, restart, aperture,
+               field, integrator, c):
+    # pushes live columns lo ... lo + count of one shard n_steps times;
+    # leapfrog velocities stay in half between runs, as in Ensemble, and
+    # start again from vel on restart
+    step = get_integrator(integrator)
+    leapfrog = step in KICKS
+    flight = a["half"] if leapfrog else a["vel"]  # x += v dt with these
+    counts = a["counts"][shard]
+    live = slice(lo, lo + counts[0])
+    if leapfrog and restart and counts[0]:
+        pos, vel = a["pos"][:, live], a["vel"][:, live]
+        qm = a["q"][live] / a["m"][live]
+        if field is not None:
+            e, b = field.fields(pos)
+        flight[:, live] = half_step(step, vel, qm, e, b, -dt, c)
+    for i in range(n_steps):
+        k = counts[0]
+        if not k:
+            break
+        live = slice(lo, lo + k)
+        pos, v = a["pos"][:, live], flight[:, live]
+        if field is not None:
+            e, b = field.fields(pos)
+        qm = a["q"][live] / a["m"][live]
+        pos[:], v[:], a["acc"][:, live] = step(pos, v, qm, e, b, dt, c)
+        if aperture is None:
+            continue
+
+        out = ~aperture.inside(pos)
+        if not out.any():
+            continue
+        p1 = pos[:, out]
+        v1 = v[:, out]
+        p0 = p1 - v1 * dt  # all integrators do x += v_new dt
+        s, face = aperture.crossing(p0, p1)
+        j = lo + counts[1]
+        rec = slice(j, j + len(s))
+        a["lost_id"][rec] = a["ids"][live][out]
+        a["lost_t"][rec] = t + (i + 1) * dt - (1 - s) * dt
+        a["lost_pos"][:, rec] = interpolate(p0, p1, s)
+        a["lost_vel"][:, rec] = half_step(
+            step, v1, qm[out], _cols(e, out), _cols(b, out), dt, c)
+        a["lost_face"][rec] = face
+
+        keep = ~out
+        kept = slice(lo, lo + int(keep.sum()))
+        for name in ("pos", "vel", "half", "acc"):
+            a[name][:, kept] = a[name][:, live][:, keep]
+        for name in ("q", "m", "ids"):
+            a[name][kept] = a[name][live][keep]
+        e, b = _cols(e, keep), _cols(b, keep)
+        counts[0] = kept.stop - lo
+        counts[1] += len(s)
+    if leapfrog and n_steps and counts[0]:  # vel at the time of pos, by
+        live = slice(lo, lo + counts[0])  # the fields of the last step
+        qm = a["q"][live] / a["m"][live]
+        a["vel"][:, live] = half_step(step, flight[:, live], qm, e, b, dt, c)
+
+
+def _worker(name, layout, lo, shard, conn):  # serves commands of a shard
+    # ("setup", (aperture, field, integrator, c)), kept for the runs
+    # ("run", (n_steps, dt, t, e, b, restart)), answered by the shard
+    # number
+    # None - stop
+    shm = SharedMemory(name=name)
+    a = _views(shm.buf, layout)
+    setup = None
+    try:
+        while True:
+            command = conn.recv()
+            if command is None:
+                break
+            kind, args = command
+            if kind == "setup":
+                setup = args
+                continue
+            aperture, field, integrator, c = setup
+            _run_shard(a, lo, shard, *args, aperture, field, integrator, c)
+            conn.send(shard)
+    finally:
+        del a  # views must go before the block is closed
+        shm.close()
+        conn.close()
+
+
+def _shutdown(shm, conns, procs):
+    # stops the workers and unlinks the block; views still held by the
+    # caller keep the mapping of this process until they are gone
+    for conn in conns:
+        try:
+            conn.send(None)
+        except OSError:  # worker already gone
+            pass
+        conn.close()
+    for proc in procs:
+        proc.join()
+    try:
+        shm.close()
+    except BufferError:
+        pass
+    shm.unlink()
+
+
+class ShardedEnsemble:
+    def __init__(self, n, q=0.5, m=1.0, integrator="euler", workers=None):
+        self.integrator = integrator  # see integrators.py
+        self.c = C_LIGHT
+        self.t = 0.0
+        self.steps = 0
+        self.workers = max(1, min(workers or os.cpu_count(), n))
+        self.bounds = np.linspace(0, n, self.workers + 1).astype(np.int64)
+
+        layout, size = _layout(n, self.workers)
+        self._shm = SharedMemory(create=True, size=max(size, 1))
+        self._a = _views(self._shm.buf, layout)
+        for name in ("pos", "vel", "half", "acc"):
+            self._a[name][:] = 0
+        self._a["q"][:] = q
+        self._a["m"][:] = m
+        self._a["ids"][:] = np.arange(n)
+        self._a["counts"][:, 0] = np.diff(self.bounds)
+        self._a["counts"][:, 1] = 0
+        self.pos, self.vel = self._a["pos"], self._a["vel"]  # for setting
+        self.q, self.m = self._a["q"], self._a["m"]  # before the first run
+
+        self._conns, self._procs = [], []
+        self._setup = None  # last sent to the workers
+        self._leapfrog = None  # integrator and dt of the half velocities
+        for shard in range(self.workers):
+            parent, child = mp.Pipe()
+            proc = mp.Process(
+                target=_worker, daemon=True,
+                args=(self._shm.name, layout, int(self.bounds[shard]),
+                      shard, child))
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        self._finalizer = weakref.finalize(
+            self, _shutdown, self._shm, self._conns, self._procs)
+
+    @classmethod
+    def from_arrays(cls, pos, vel, q=0.5, m=1.0, integrator="euler",
+                    workers=None):
+        pos = np.asarray(pos, dtype=np.float64)
+        beam = cls(pos.shape[1], integrator=integrator, workers=workers)
+        beam.pos[:] = pos
+        beam.vel[:] = vel
+        beam.q[:] = q
+        beam.m[:] = m
+        return beam
+
+    def changed(self):  # call after editing q, m or vel arrays in place
+        self._leapfrog = None
+
+    @property
+    def n(self):  # number of live particles
+        return int(self._a["counts"][:, 0].sum())
+
+    def run(self, n_steps, dt, e_vec, b_vec, aperture=None, field=None):
+        # n pushes of every shard in parallel, returns when all are done
+        setup = (aperture, field, self.integrator, self.c)
+        if self._setup is None \
+                or any(x is not y for x, y in zip(setup, self._setup)):
+            for conn in self._conns:
+                conn.send(("setup", setup))
+            self._setup = setup
+        restart = self._leapfrog != (self.integrator, dt)
+        self._leapfrog = (self.integrator, dt)
+        command = ("run", (n_steps, dt, self.t, as_column(e_vec),
+                           as_column(b_vec), restart))
+        for conn in self._conns:
+            conn.send(command)
+        for conn in self._conns:
+            conn.recv()
+        self.t += n_steps * dt
+        self.steps += n_steps
+
+    def push(self, dt, e_vec, b_vec, aperture=None, field=None):
+        self.run(1, dt, e_vec, b_vec, aperture, field)
+
+    def _collect(self, names, count):  # copies of the used shard columns
+        parts = {name: [] for name in names}
+        for shard, lo in enumerate(self.bounds[:-1]):
+            used = slice(lo, lo + self._a["counts"][shard, count])
+            for name in names:
+                parts[name].append(self._a[name][..., used])
+        return {name: np.concatenate(p, axis=-1) for name, p in parts.items()}
+
+    def arrays(self):  # pos, vel, acc, q, m and ids of live particles
+        return self._collect(("pos", "vel", "acc", "q", "m", "ids"), 0)
+
+    def lost_particles(self):  # id, t, pos, vel and face, as Ensemble
+        lost = self._collect(
+            ("lost_id", "lost_t", "lost_pos", "lost_vel", "lost_face"), 1)
+        return {name[5:]: value for name, value in lost.items()}
+
+    def close(self):  # stops workers and frees the shared block
+        self.pos = self.vel = self.q = self.m = self._a = None
+        self._setup = self._leapfrog = None
+        self._finalizer()  # once, later calls do nothing
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Space charge of an ensemble by particle-in-cell, O(N + M log M) per
+# update for N particles and M grid nodes instead of O(N^2) pair forces:
+#     deposit  - charges to the nodes of a grid around the beam
+#                (cloud-in-cell, linear weights to the 8 cell corners)
+#     solve    - potential of the grid charge with open boundaries:
+#                convolution with the Green function 1 / (4 pi eps0 r)
+#                on the doubled grid by FFT (Hockney's method)
+#     gather   - E = -grad phi at the nodes, interpolated back to the
+#                particles with the same linear weights (see fields.py)
+# The magnetic self-field is taken as B = v_mean x E / c^2 of a beam
+# moving as a whole.
+# SpaceCharge is a field source (fields(pos) -> (e, b)) for
+# Ensemble.push, adding self-fields to an external source:
+#     sc = SpaceCharge(ens, external=UniformField(e_vec, b_vec))
+#     ens.run(n_steps, dt, e_vec, b_vec, aperture, field=sc)
+# The grid follows the beam, it is rebuilt every `interval` pushes;
+# in between the last grid is reused (no self-field outside of it).
+# state() / load_state() keep the call count and that grid in checkpoints
+# (checkpoint.py), so a resumed run updates the grid at the same pushes.
+
+import numpy as np
+
+from tracker.fields import FieldMap
+from tracker.integrators import cross
+
+
+class SpaceCharge:
+    def __init__(self, ensemble, external=None, shape=(32, 32, 32),
+                 interval=1, margin=0.1, eps0=1.0, magnetic=True):
+        self.ensemble = ensemble  # charges ensemble.q at ensemble.pos
+        self.external = external  # field source of magnets etc., or None
+        self.shape = np.array(shape)  # grid nodes along x, y, z
+        self.interval = interval  # pushes between grid updates
+        self.margin = margin  # free space around the beam, part of size
+        self.eps0 = eps0  # vacuum permittivity in units of the lectures
+        self.magnetic = magnetic  # adds B = v_mean x E / c^2
+
+        self.calls = 0
+        self.grid = None  # FieldMap of self-fields from the last update
+        self._green = None  # (spacing, FFT of Green function)
+
+    def box(self, pos):  # (origin, spacing) of grid around positions
+        lo, hi = pos.min(axis=1), pos.max(axis=1)
+        size = hi - lo
+        size = np.maximum(size, 1e-3 * size.max() + 1e-12)  # flat beams
+        lo = lo - self.margin * size
+        return lo, size * (1 + 2 * self.margin) / (self.shape - 1)
+
+    def deposit(self, pos, q, origin, spacing):  # charge density at nodes
+        n = self.shape[:, np.newaxis]
+        u = (pos - origin[:, np.newaxis]) / spacing[:, np.newaxis]
+        i0 = np.clip(np.floor(u), 0, n - 2).astype(np.intp)
+        f = u - i0
+        g = 1 - f
+        strides = np.array([n[1, 0] * n[2, 0], n[2, 0], 1])
+        base = strides @ i0
+
+        rho = np.zeros(int(np.prod(self.shape)))
+        for dx in (0, 1):
+            wx = q * (f[0] if dx else g[0])
+            for dy in (0, 1):
+                wxy = wx * (f[1] if dy else g[1])
+                for dz in (0, 1):
+                    w = wxy * (f[2] if dz else g[2])
+                    corner = base + dx * strides[0] + dy * strides[1] + dz
+                    rho += np.bincount(corner, w, minlength=rho.size)
+        return rho.reshape(self.shape) / np.prod(spacing)
+
+    def green(self, spacing):  # FFT of Green function on doubled grid
+        if self._green is not None and np.array_equal(
+                self._green[0], spacing):
+            return self._green[1]
+        axes = []
+        for n, h in zip(self.shape, spacing):
+            k = np.arange(2 * n)
+            axes.append(np.minimum(k, 2 * n - k) * h)  # periodic distance
+        x, y, z = np.meshgrid(*axes, indexing="ij", sparse=True)
+        r = np.sqrt(x**2 + y**2 + z**2)
+        r[0, 0, 0] = 0.5 * spacing.min()  # self-cell, no singularity
+        g_hat = np.fft.rfftn(1 / (4 * np.pi * self.eps0 * r))
+        self._green = (spacing.copy(), g_hat)
+        return g_hat
+
+    def solve(self, rho, spacing):  # potential at nodes, open boundaries
+        size = tuple(2 * self.shape)
+        rho_hat = np.fft.rfftn(rho, s=size, axes=(0, 1, 2))
+        phi = np.fft.irfftn(
+            rho_hat * self.green(spacing), s=size, axes=(0, 1, 2))
+        nx, ny, nz = self.shape
+        return phi[:nx, :ny, :nz] * np.prod(spacing)
+
+    def update(self):  # new grid of self-fields from the ensemble
+        ens = self.ensemble
+        data = np.zeros((6,) + tuple(self.shape))
+        if ens.n:
+            origin, spacing = self.box(ens.pos)
+            rho = self.deposit(ens.pos, ens.q, origin, spacing)
+            phi = self.solve(rho, spacing)
+            data[:3] = np.gradient(phi, *spacing)
+            data[:3] *= -1
+            if self.magnetic:
+                v_mean = ens.vel.mean(axis=1)
+                data[3:] = cross(
+                    v_mean.reshape(3, 1, 1, 1), data[:3]) / ens.c**2
+        else:
+            origin, spacing = np.zeros(3), np.ones(3)
+        self.grid = FieldMap(data, origin, spacing)
+
+    def state(self):  # calls and grid of the last update, as arrays
+        state = dict(calls=np.array(self.calls))
+        if self.grid is not None:
+            state.update(grid=self.grid.data, origin=self.grid.origin[:, 0],
+                         spacing=self.grid.spacing[:, 0])
+        return state
+
+    def load_state(self, arrays):
+        self.calls = int(arrays["calls"])
+        self.grid = None
+        if "grid" in arrays:
+            self.grid = FieldMap(
+                arrays["grid"], arrays["origin"], arrays["spacing"])
+
+    def fields(self, pos):
+        if self.grid is None or self.calls % self.interval == 0:
+            self.update()
+        self.calls += 1
+        e, b = self.grid.fields(pos)
+        if self.external is not None:
+            e_ext, b_ext = self.external.fields(pos)
+            e += e_ext
+            b += b_ext
+        return e, b
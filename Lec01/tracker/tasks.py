@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+# Launches as tasks of one frame scheduler (asyncio), instead of one
+# blocking while loop per launch.
+# Every launch is a Task with its own step / render / running functions
+# (see loop.py); it can be paused, resumed and cancelled at any time, and
+# any number of them fly at once. A single tick per frame
+#     on_frame()                  - e.g. slider changes (params.py)
+#     physics of running tasks    - within budget of the frame time,
+#                                   shared between the tasks; fixed
+#                                   substeps that do not fit are carried
+#                                   over to the next tick, at most
+#                                   CATCH_UP frames of them, the rest is
+#                                   dropped (no burst after a stall)
+#     render() of advanced tasks  - once per frame each
+#     trail() of advanced tasks   - trail growth, timed apart from render
+# drives them all, and between ticks the scheduler awaits the rest of
+# the frame, so the event loop (buttons, sliders, other coroutines) is
+# never starved by physics. vpython's rate() is not used, it would block
+# the loop. Phases of ticks are timed by Instruments (instruments.py).
+# Widget callbacks of vpython run in another thread; wrapped by
+# threadsafe() they run in the thread of the loop, between ticks, so
+# tasks and parameters are only ever changed there.
+#
+#     scheduler = Scheduler(fps=30)
+#     task = scheduler.launch(step, render, running)
+#     task.pause(); task.resume(); task.cancel()
+#     scheduler.start()   # in a running loop, or blocks until all done
+#     button(text="Launch!", bind=scheduler.threadsafe(launch))
+
+import asyncio
+import threading
+from time import perf_counter
+
+from tracker.instruments import Instruments
+from tracker.loop import advance
+
+RUNNING, PAUSED, FINISHED, CANCELLED = "running", "paused", "finished",\
+    "cancelled"
+CATCH_UP = 2  # frames of fixed substeps owed at most
+
+
+class Task:
+    def __init__(self, step, render, running, substeps=None, name=None,
+                 on_done=None, trail=None):
+        self.step = step  # one physics step, no scene updates
+        self.render = render  # pushes state to the scene
+        self.trail = trail  # grows the trail, None - part of render
+        self.running = running  # False when particle left the boundaries
+        self.substeps = substeps  # steps per frame, None - within budget
+        self.name = name
+        self.on_done = on_done  # on_done(task) when finished or cancelled
+        self.state = RUNNING
+        self.frames = self.steps = 0
+        self.owed = 0  # fixed substeps not done in their tick yet
+        self.started = perf_counter()
+
+    @property
+    def done(self):
+        return self.state in (FINISHED, CANCELLED)
+
+    def set_substeps(self, substeps):  # e.g. other time step, owed dropped
+        self.substeps = substeps
+        self.owed = 0
+
+    def pause(self):
+        if self.state == RUNNING:
+            self.state = PAUSED
+
+    def resume(self):
+        if self.state == PAUSED:
+            self.state = RUNNING
+
+    def cancel(self):
+        self._finish(CANCELLED)
+
+    def _finish(self, state):
+        if self.done:
+            return
+        self.state = state
+        if self.on_done is not None:
+            self.on_done(self)
+
+    async def wait(self, poll=1 / 30):  # until finished or cancelled
+        while not self.done:
+            await asyncio.sleep(poll)
+        return self.state
+
+
+class Scheduler:
+    def __init__(self, fps=30, budget=0.8, on_frame=None, paced=True,
+                 instruments=None):
+        self.fps = fps  # ticks per second
+        self.paced = paced  # False - next tick at once (headless runs)
+        self.budget = budget  # part of frame time for physics
+        self.on_frame = on_frame  # called first in every tick
+        self.tasks = []  # tasks not done yet
+        self.serving = False  # serve() is running
+        self.loop = None  # event loop of serve(), and its thread
+        self.thread = None
+        self.instruments = instruments or Instruments()  # off by default
+
+    def launch(self, step, render, running, substeps=None, name=None,
+               on_done=None, trail=None):
+        task = Task(step, render, running, substeps, name, on_done, trail)
+        self.tasks.append(task)
+        return task
+
+    def tick(self):  # one frame of all tasks
+        ins = self.instruments
+        start = perf_counter()
+        if self.on_frame is not None:
+            with ins.phase("slider"):
+                self.on_frame()
+        active = [t for t in self.tasks if t.state == RUNNING]
+        seconds = self.budget / self.fps / max(1, len(active))
+        steps = requested = 0
+        with ins.phase("physics"):
+            for task in active:
+                if task.running():
+                    limit = None  # budget mode: as many as fit
+                    if task.substeps is not None:
+                        task.owed = min(task.owed + task.substeps,
+                                        CATCH_UP * task.substeps)
+                        requested += task.substeps
+                        limit = task.owed
+                    done = advance(task.step, task.running, limit, seconds)
+                    if limit is not None:
+                        task.owed -= done
+                    task.steps += done
+                    steps += done
+        # tasks cancelled during physics are not shown
+        shown = [t for t in active if t.state != CANCELLED]
+        with ins.phase("render"):
+            for task in shown:
+                task.render()
+                task.frames += 1
+        with ins.phase("trail"):
+            for task in shown:
+                if task.trail is not None:
+                    task.trail()
+        for task in active:
+            if not task.running():
+                task._finish(FINISHED)
+        ins.frame(perf_counter() - start, steps, requested, 1 / self.fps)
+        self._forget()
+
+    def _forget(self):  # drops done tasks, with their totals
+        for task in self.tasks:
+            if task.done:
+                self.instruments.finished(task)
+        self.tasks = [t for t in self.tasks if not t.done]
+
+    async def serve(self, forever=False):  # ticks until no tasks are left
+        self.serving = True
+        self.loop = asyncio.get_running_loop()
+        self.thread = threading.get_ident()
+        try:
+            frame = 1 / self.fps
+            next_tick = perf_counter()
+            while forever or self.tasks:
+                self.tick()
+                if not self.paced:
+                    await asyncio.sleep(0)
+                    continue
+                next_tick = max(next_tick + frame, perf_counter())
+                with self.instruments.phase("wait"):
+                    await asyncio.sleep(next_tick - perf_counter())
+        finally:
+            self.serving = False
+            self.loop = self.thread = None
+
+    def start(self):  # drives tasks in running loop, else blocks till done
+        if self.serving:
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.serve())
+            return None
+        return loop.create_task(self.serve())
+
+    def call(self, func, *args):  # func(*args) in the thread of the loop
+        loop = self.loop
+        if loop is None or self.thread == threading.get_ident():
+            return func(*args)
+        loop.call_soon_threadsafe(func, *args)
+        return None
+
+    def threadsafe(self, func):  # widget callback run by call()
+        return lambda: self.call(func)  # no widget argument
+
+    def pause(self):  # all tasks
+        for task in self.tasks:
+            task.pause()
+
+    def resume(self):
+        for task in self.tasks:
+            task.resume()
+
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+        self._forget()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# Bounded trail of a particle.
+# make_trail=True on a sphere keeps every point forever, so long launches
+# (dt=1e-5 in Lec01.py) slow down drawing and eat memory. Here the points
+# live in a fixed-capacity ring buffer, and a new point is
+#     dropped   - if it is closer than min_distance to the last one,
+#     merged    - if the path goes on straight (turn below max_angle),
+#                 the last point is moved instead of adding a new one,
+#     appended  - otherwise, overwriting the oldest one when full.
+# The same decisions are mirrored to a vpython curve with retain=capacity,
+# so memory and draw cost stay constant however long the launch is.
+
+import numpy as np
+
+from tracker.integrators import to_array
+
+
+class Trail:
+    def __init__(self, curve=None, capacity=2000, min_distance=0.05,
+                 max_angle=2.0):
+        self.curve = curve  # vpython curve to draw the trail, may be None
+        self.capacity = capacity  # maximum number of points
+        self.min_distance = min_distance  # shorter steps are dropped
+        self.cos_max = np.cos(np.radians(max_angle))  # for merging, deg
+
+        self.points_buffer = np.zeros((capacity, 3))  # ring buffer
+        self.head = 0  # index where the next point goes
+        self.count = 0  # number of stored points
+        if curve is not None:
+            curve.retain = capacity
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, back):  # buffer index of point `back` from the end
+        return (self.head - back) % self.capacity
+
+    def add(self, pos):  # adds point (vector or sequence) to the trail
+        p = to_array(pos)
+        if self.count:
+            last = self.points_buffer[self._index(1)]
+            step = p - last
+            length2 = step @ step
+            if self.count >= 2:
+                prev = self.points_buffer[self._index(2)]
+                seg = last - prev
+                dot = seg @ step
+                if dot > 0 and dot * dot >= \
+                        self.cos_max**2 * (seg @ seg) * length2:
+                    self._replace_last(p, pos)  # straight: extend segment
+                    return
+            if length2 < self.min_distance**2:
+                return
+        self._append(p, pos)
+
+    def _append(self, p, pos):
+        self.points_buffer[self.head] = p
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        if self.curve is not None:
+            self.curve.append(pos)
+
+    def _replace_last(self, p, pos):
+        self.points_buffer[self._index(1)] = p
+        if self.curve is not None:
+            self.curve.modify(self.curve.npoints - 1, pos=pos)
+
+    def clear(self):  # forgets all points (reset of particle)
+        self.head = self.count = 0
+        if self.curve is not None:
+            self.curve.clear()
+
+    def points(self):  # (count, 3) array of points, oldest first
+        if self.count < self.capacity:
+            return self.points_buffer[:self.count].copy()
+        return np.roll(self.points_buffer, -self.head, axis=0)